@@ -1,102 +1,984 @@
+import random
+import sys
+import threading
+import time
+from array import array
+from collections import deque, OrderedDict
+from functools import lru_cache, partial
+from itertools import chain, islice, repeat
+
+import sudoku_dlx
+
+#: names of the engines of Sudoku.recursive_solve()
+ENGINES = ("rules", "dlx")
+
+#: names of the rules of Sudoku._solve_step() reported to a SolveObserver, the rules after
+#: the first two are the strategies of STRATEGIES
+RULES = ("only_choice", "single_possibility", "hidden_twin", "subgroup_exclusion",
+         "naked_subset", "hidden_subset", "x_wing", "swordfish")
+
+#: the strategies that Sudoku.strategies applies by default, in this order
+DEFAULT_STRATEGIES = ("hidden_twin", "subgroup_exclusion")
+
+#: largest number of cells (digits) of the subsets found by the naked (hidden) subset rule
+MAX_SUBSET = 4
+
+#: the branching policies that recursive_solve() uses by default, see VARIABLE_ORDERS and
+#: VALUE_ORDERS
+DEFAULT_VARIABLE_ORDER = "mrv"
+DEFAULT_VALUE_ORDER = "ascending"
+
+#: characters of the digits in lines (see Sudoku.read_line), digits above 9 are letters
+SYMBOLS = "0123456789ABCDEFGHIJKLMNOP"
+
+#: bytes.translate() tables between the characters of a line and the digits:
+#: _LINE_VALUES maps the characters to the digits, '.' to 0 and all other characters to
+#: 255, _LINE_SYMBOLS maps the digits back to SYMBOLS
+_LINE_VALUES = bytearray([255]) * 256
+for _n, _c in enumerate(SYMBOLS):
+    _LINE_VALUES[ord(_c)] = _LINE_VALUES[ord(_c.lower())] = _n
+_LINE_VALUES[ord(".")] = 0
+_LINE_VALUES = bytes(_LINE_VALUES)
+_LINE_SYMBOLS = SYMBOLS.encode("ascii").ljust(256, b"?")
+#: _CELL_TEXT[n] = text of the digit n in Sudoku.__str__(), a blank for no value
+_CELL_TEXT = [" "] + [str(n) for n in range(1, len(SYMBOLS))]
+#: str.translate() table that removes the white space ignored by Sudoku.read_string()
+_NO_WHITESPACE = str.maketrans("", "", " \t\r\n")
+del _n, _c
+
+
+class _MaskFunction:
+    """
+    computes function(mask) on every lookup, used like the lists of _Geometry for more
+    than 9 digits, where a list of all masks would be too big
+    """
+    __slots__ = ("_function",)
+
+    def __init__(self, function):
+        self._function = function
+
+    def __getitem__(self, mask):
+        return self._function(mask)
+
+
+#: number of masks whose digits are cached for more than 9 digits, see _Geometry
+_DIGITS_CACHE_SIZE = 4096
+
+
+class _Geometry:
+    """
+    Lookup tables of the grids with boxes of box_size x box_size cells, shared by all
+    sudokus of that size, see _geometry().
+
+    Attributes:
+        box_size        width and height of a box
+        size            width and height of the grid and number of digits, box_size ** 2
+        all_digits      candidate mask with all digits
+        popcount        popcount[mask] = number of digits contained in the candidate mask
+        lowest_digit    lowest_digit[mask] = smallest digit contained in the mask, 0 for the
+                        empty mask
+        digits          digits[mask] = tuple of the digits contained in the mask in
+                        ascending order
+        column_cells    (x, y) coordinates of the cells of each unit, column_cells[x],
+        row_cells       row_cells[y] and box_cells[x // box_size][y // box_size]
+        box_cells
+        peers           peers[x][y] = coordinates of the cells that share a column, row or
+                        box with (x, y)
+        unit_cells      unit_cells[unit] = coordinates of the cells of a unit in the order of
+                        Sudoku.unit_coords(), the units are numbered like in Sudoku._dirty
+        cell_units      cell_units[x][y] = tuple (column, row, box) of the units of (x, y)
+        subgroups       subgroups[box] = list of the (inside, outside) tuples of the columns
+                        and rows crossing the box, inside are the coordinates of the cells
+                        of the line in the box and outside the other cells of the line
+        zobrist         zobrist[x][y] = tuple of 2 * size random 64 bit keys of the cell,
+                        zobrist[x][y][n - 1] for the digit n in the cell and
+                        zobrist[x][y][size + n - 1] for the digit n excluded from the cell,
+                        see TranspositionTable
+    """
+    def __init__(self, box_size):
+        size = box_size * box_size
+        self.box_size = box_size
+        self.size = size
+        self.all_digits = (1 << size) - 1
+
+        def digits(mask):
+            return tuple(n for n in range(1, size + 1) if mask >> (n - 1) & 1)
+
+        def lowest_digit(mask):
+            return (mask & -mask).bit_length()
+
+        if size <= 9:
+            masks = range(self.all_digits + 1)
+            self.popcount = [mask.bit_count() for mask in masks]
+            self.lowest_digit = [lowest_digit(mask) for mask in masks]
+            self.digits = [digits(mask) for mask in masks]
+        else:
+            # bit counts are cheap to compute, only the tuples of digits are worth caching,
+            # in a bounded cache since a big puzzle meets many thousands of masks
+            self.popcount = _MaskFunction(int.bit_count)
+            self.lowest_digit = _MaskFunction(lowest_digit)
+            self.digits = _MaskFunction(lru_cache(_DIGITS_CACHE_SIZE)(digits))
+
+        b = box_size
+        self.column_cells = [[(x, y) for y in range(size)] for x in range(size)]
+        self.row_cells = [[(x, y) for x in range(size)] for y in range(size)]
+        self.box_cells = [[[(b * bx + i, b * by + j) for j in range(b) for i in range(b)]
+                           for by in range(b)] for bx in range(b)]
+        self.peers = [[sorted(set(self.column_cells[x] + self.row_cells[y]
+                                  + self.box_cells[x // b][y // b]) - {(x, y)})
+                       for y in range(size)] for x in range(size)]
+        self.unit_cells = (self.column_cells + self.row_cells
+                           + [[(b * (i // b) + j // b, b * (i % b) + j % b)
+                               for j in range(size)] for i in range(size)])
+        self.cell_units = [[(x, size + y, 2 * size + b * (x // b) + y // b)
+                            for y in range(size)] for x in range(size)]
+        self.subgroups = []
+        for bx in range(b):
+            for by in range(b):
+                lines = []
+                for k in range(b):
+                    column = self.column_cells[b * bx + k]
+                    row = self.row_cells[b * by + k]
+                    lines.append((column[b * by:b * by + b],
+                                  column[:b * by] + column[b * by + b:]))
+                    lines.append((row[b * bx:b * bx + b], row[:b * bx] + row[b * bx + b:]))
+                self.subgroups.append(lines)
+        # the same keys in every process, so that tables could be compared and merged
+        rng = random.Random(box_size)
+        self.zobrist = [[tuple(rng.getrandbits(64) for _ in range(2 * size))
+                         for y in range(size)] for x in range(size)]
+
+
+#: _GEOMETRIES[box_size] = _Geometry of the box size, created by _geometry()
+_GEOMETRIES = {}
+
+
+def _geometry(box_size):
+    """
+    :return: the shared _Geometry of the box size
+    """
+    geometry = _GEOMETRIES.get(box_size)
+    if geometry is None:
+        if box_size < 1 or box_size * box_size >= len(SYMBOLS):
+            raise ValueError("box size %r is not supported" % (box_size,))
+        geometry = _GEOMETRIES[box_size] = _Geometry(box_size)
+    return geometry
+
+
+def box_size_of_line(line):
+    """
+    :param line:    a puzzle in the format of Sudoku.read_line
+    :return: the box size of the puzzle, 3 for 81 characters, 4 for 256 and 5 for 625
+    :raise ValueError: if the length of the line is not the number of cells of a grid
+    """
+    length = len(line.strip())
+    box_size = round(length ** 0.25)
+    if box_size ** 4 != length:
+        raise ValueError("%i characters are no square grid of boxes" % length)
+    return box_size
+
+
+#: candidate masks use bit (n - 1) for digit n, so all nine digits of a 9x9 sudoku are
+#: 0x1FF, see _Geometry.all_digits for other sizes
+ALL_DIGITS = _geometry(3).all_digits
+
+
+def digit_bit(n):
+    """:returns the candidate mask that only contains the digit n"""
+    return 1 << (n - 1)
+
+
 class IncorrectSudokuException(Exception):
     pass
 
 
+class SolveBudgetExceeded(Exception):
+    """
+    The search of recursive_solve() or count_solutions() was stopped before it could
+    decide the sudoku. The attributes hold the statistics of the search so far.
+
+    Attributes:
+        reason      "max_nodes", "deadline" or "cancelled"
+        nodes       number of guesses made
+        max_depth   largest number of guesses on one path, for the dlx engine the largest
+                    number of selected rows
+        seconds     time spent in the search
+        solutions   number of solutions found, only count_solutions() finds more than 0
+    """
+    def __init__(self, reason, nodes, max_depth, seconds, solutions=0):
+        super().__init__("%s after %i nodes and %.3f seconds" % (reason, nodes, seconds))
+        self.reason = reason
+        self.nodes = nodes
+        self.max_depth = max_depth
+        self.seconds = seconds
+        self.solutions = solutions
+
+    def __reduce__(self):
+        # Exception pickles args, which only hold the message, so the worker processes
+        # of sudoku_bulk could not send the exception back without this
+        return type(self), (self.reason, self.nodes, self.max_depth, self.seconds,
+                            self.solutions)
+
+
+class CancelToken:
+    """
+    Stops a search from another thread: cancel() makes the search of recursive_solve() or
+    count_solutions() that got the token raise SolveBudgetExceeded at its next guess.
+    """
+    def __init__(self, event=None):
+        """
+        :param event:   the event that is set by cancel(), a new threading.Event by
+                        default, a multiprocessing.Event cancels searches in other processes
+        """
+        self._event = threading.Event() if event is None else event
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class _Budget:
+    """
+    the limits of a search, check() is called before every guess
+    """
+    def __init__(self, max_nodes=None, deadline=None, cancel=None):
+        """
+        :param max_nodes:   largest number of guesses, None for no limit
+        :param deadline:    time.monotonic() at which the search stops, None for no limit
+        :param cancel:      None or a CancelToken
+        """
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        self.cancel = cancel
+        self.max_depth = 0
+        self.start = time.monotonic()
+
+    def check(self, nodes, depth):
+        """
+        :param nodes:   number of guesses including the next one
+        :param depth:   depth of the next guess
+        :raise SolveBudgetExceeded: if the next guess is beyond the budget
+        """
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            reason = "max_nodes"
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            reason = "deadline"
+        elif self.cancel is not None and self.cancel.cancelled:
+            reason = "cancelled"
+        else:
+            self.max_depth = max(self.max_depth, depth)
+            return
+        raise SolveBudgetExceeded(reason, nodes - 1, self.max_depth,
+                                  time.monotonic() - self.start)
+
+
+class _LruTable:
+    """
+    Bounded table that evicts the least recently used entries, the bookkeeping shared by
+    TranspositionTable and sudoku_cache.SolutionCache.
+
+    Attributes:
+        maxsize     maximal number of entries
+        hits        number of lookups that found an entry
+        misses      number of lookups that found none
+        evictions   number of entries evicted
+        _entries    OrderedDict key -> value, the least recently used entry comes first
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def _lookup(self, key, default=None):
+        """
+        :return: the value stored for the key, default if there is none
+        """
+        value = self._entries.get(key, default)
+        if value is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        """
+        add an entry and evict the least recently used ones beyond maxsize
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        remove all entries and reset the statistics
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        :return: dict with the keys hits, misses, hit_rate, size and maxsize
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+
+class TranspositionTable(_LruTable):
+    """
+    Bounded table of the number of solutions of the partial grids searched by the rules
+    engine, shared by the searches of recursive_solve() and count_solutions() that get the
+    table. The searches look up every grid before they search it and skip the grids with
+    a known count: recursive_solve() the grids proven to have no solution, count_solutions()
+    all of them, adding their counts. The grids are identified by the Zobrist keys of
+    _Geometry, the xor of the keys of the digits in the cells and of the digits excluded by
+    count_solutions().
+    The nodes of a single search never repeat, the grids of sibling branches differ in the
+    guessed cell, so the table pays off when several searches on the same or on related
+    puzzles share it, e.g. uniqueness checks of puzzles that differ in a few clues.
+    The least recently used entries are evicted, see _LruTable for the attributes, the
+    entries map Zobrist keys to the number of solutions of the grid.
+    """
+    def __init__(self, maxsize=1 << 16):
+        super().__init__(maxsize)
+
+    def get(self, key):
+        """
+        :return: the number of solutions stored for the Zobrist key, None if it is unknown
+        """
+        return self._lookup(key)
+
+    def store(self, key, count):
+        """
+        add an entry and evict the least recently used ones beyond maxsize
+        :param count:   number of solutions of the completely searched grid
+        """
+        self._store(key, count)
+
+    def stats(self):
+        """
+        :return: dict with the keys of _LruTable.stats(), evictions and memory_bytes, the
+                 size of the entries measured by sys.getsizeof()
+        """
+        stats = super().stats()
+        stats["evictions"] = self.evictions
+        stats["memory_bytes"] = sys.getsizeof(self._entries) + sum(
+            sys.getsizeof(key) + sys.getsizeof(count) for key, count in self._entries.items())
+        return stats
+
+
+class SolveObserver:
+    """
+    Receives the events of the solver when it is assigned to Sudoku.observer. The methods
+    of this class do nothing, subclasses override the events they are interested in.
+    Without an observer the solver only pays for a check of Sudoku.observer per step.
+    """
+    def on_rule(self, rule, seconds, changed):
+        """
+        a rule of Sudoku._solve_step() has been applied
+        :param rule:    name of the rule, see RULES. Every digit taken from the work queue is
+                        reported as "only_choice" if it was the last possibility of its
+                        cell and as "single_possibility" otherwise.
+        :param seconds: time spent in the rule
+        :param changed: True if the rule placed a digit or removed a possibility
+        """
+
+    def on_guess(self, x, y, n, candidates, depth, seconds):
+        """
+        the search guesses the digit n for the cell (x, y)
+        :param candidates:  number of possibilities of the cell
+        :param depth:       number of guesses on the path to the new node, including this one
+        :param seconds:     time spent choosing the cell and taking back earlier guesses
+        """
+
+    def on_backtrack(self, depth):
+        """
+        the search takes back the guess at depth, because it led to a contradiction or
+        because the search continues after a solution
+        """
+
+    def on_solution(self, depth):
+        """
+        the search found a solution after depth guesses
+        """
+
+
+class SolveStats(SolveObserver):
+    """
+    Observer that sums up the events of the solver.
+
+    Attributes:
+        calls       calls[rule] = number of applications of each rule in RULES and of
+                    "guess"
+        changes     changes[rule] = number of applications that changed the sudoku
+        seconds     seconds[rule] = time spent in the rule
+        nodes       number of nodes of the search tree below the root, one per guess
+        max_depth   largest number of guesses on one path
+        backtracks  number of guesses that have been taken back
+        solutions   number of solutions found
+    """
+    def __init__(self):
+        self.calls = dict.fromkeys(RULES + ("guess",), 0)
+        self.changes = dict.fromkeys(RULES + ("guess",), 0)
+        self.seconds = dict.fromkeys(RULES + ("guess",), 0.0)
+        self.nodes = 0
+        self.max_depth = 0
+        self.backtracks = 0
+        self.solutions = 0
+
+    def on_rule(self, rule, seconds, changed):
+        # strategies added to STRATEGIES are not in RULES
+        self.calls[rule] = self.calls.get(rule, 0) + 1
+        self.changes[rule] = self.changes.get(rule, 0) + changed
+        self.seconds[rule] = self.seconds.get(rule, 0.0) + seconds
+
+    def on_guess(self, x, y, n, candidates, depth, seconds):
+        self.calls["guess"] += 1
+        self.changes["guess"] += 1
+        self.seconds["guess"] += seconds
+        self.nodes += 1
+        self.max_depth = max(self.max_depth, depth)
+
+    def on_backtrack(self, depth):
+        self.backtracks += 1
+
+    def on_solution(self, depth):
+        self.solutions += 1
+
+    def as_dict(self):
+        """
+        :return: flat dict of all counters for metric exporters, the keys of the per rule
+                 values are "<rule>.calls", "<rule>.changes" and "<rule>.seconds"
+        """
+        result = {"nodes": self.nodes, "max_depth": self.max_depth,
+                  "backtracks": self.backtracks, "solutions": self.solutions}
+        for rule in self.calls:
+            result[rule + ".calls"] = self.calls[rule]
+            result[rule + ".changes"] = self.changes[rule]
+            result[rule + ".seconds"] = self.seconds[rule]
+        return result
+
+
+def _poss_typecode(size):
+    """
+    :return: typecode of the array of the possibility masks in SudokuState.data
+    """
+    return "H" if size <= 16 else "I"
+
+
+class SudokuState:
+    """
+    Compact snapshot of the digits and the possibilities of a Sudoku, see
+    Sudoku.snapshot() and Sudoku.restore(). A 9x9 state takes about 300 bytes where a copy
+    of the Sudoku takes about 8 KiB. States are immutable and compare and hash by their
+    bytes.
+
+    Attributes:
+        box_size    width and height of a box
+        data        bytes of the digits of the cells row by row, followed by the
+                    possibility masks of the cells row by row as unsigned integers of 2
+                    bytes (4 bytes for more than 16 digits) in native byte order
+    """
+    __slots__ = ("box_size", "data")
+
+    def __init__(self, box_size, data):
+        self.box_size = box_size
+        self.data = data
+
+    def __eq__(self, other):
+        if not isinstance(other, SudokuState):
+            return NotImplemented
+        return self.box_size == other.box_size and self.data == other.data
+
+    def __hash__(self):
+        return hash(self.data)
+
+    def __repr__(self):
+        return "SudokuState(%r)" % self.to_line()
+
+    def to_line(self):
+        """
+        :return: the digits in the line format of Sudoku.read_line()
+        """
+        cells = self.box_size ** 4
+        return self.data[:cells].translate(_LINE_SYMBOLS).decode("ascii")
+
+
 class Sudoku:
     """
-    Reads, stores and solves 9x9 sudoku puzzles.
+    Reads, stores and solves sudoku puzzles, by default 9x9 sudokus with 3x3 boxes. Larger
+    puzzles like 16x16 or 25x25 sudokus are created with Sudoku(box_size=4) or
+    Sudoku(box_size=5).
 
     Attributes:
-        grid            a 9x9 list of integer-lists for holding the the puzzle numbers,
-                        zero symbolizes no value
+        grid            a 9x9 (size x size) list of integer-lists for holding the the puzzle
+                        numbers, zero symbolizes no value
+        box_size        width and height of a box, 3 for 9x9 sudokus
+        size            width and height of the grid and number of digits, box_size ** 2
         solved          True when sudoku has been successfully solved
+        guesses         number of digits guessed by the last search of recursive_solve()
+                        or count_solutions(), including the wrong guesses
+        strategies      names of the exclusion rules applied by _solve_step() in this
+                        order, see STRATEGIES, DEFAULT_STRATEGIES by default
+        observer        None or a SolveObserver that is informed about the rules applied
+                        and the guesses made by the rules engine
+        variable_order  name of the policy that chooses the cell to guess in, see
+                        VARIABLE_ORDERS, DEFAULT_VARIABLE_ORDER by default
+        value_order     name of the policy that orders the digits to guess, see
+                        VALUE_ORDERS, DEFAULT_VALUE_ORDER by default
 
-        _boxes          3x3 list of lists of sets, containing each number contained
-                        in a box (a box is a 3x3 segment of the puzzle)
-        _rows           list of sets, containing each number in a row
-        _columns        list of sets, containing each number in a column
-        _poss           9x9 list of lists of sets, stores the possible numbers
-                        for each cell
+        _boxes          3x3 (box_size x box_size) list of lists of digit masks, containing
+                        each number contained in a box (a box is a 3x3 segment of the puzzle)
+        _rows           list of digit masks, containing each number in a row
+        _columns        list of digit masks, containing each number in a column
+        _poss           9x9 (size x size) list of lists of digit masks, stores the possible
+                        numbers for each cell
         _possCRows      list of lists that store the count of a possible number for each row
                         _possCRows[row][number-1]: count of possibilities for "number" in the row
         _possCColumns   same as _possCRows, but for columns
         _possCBoxes     same as _possCRows, but for boxes
+        _counts         _counts[unit] = the list of the possibility counts of a unit, the
+                        lists of _possCColumns, _possCRows and _possCBoxes numbered like
+                        the units in _dirty
+        _free_cells     count of cells that do not contain a digit yet
+        _queue          work queue of (x, y, n) tuples, digits n that have been found
+                        for the cell (x, y) by the only choice or single possibility
+                        rule but have not been placed yet
+        _dirty          list of the units whose possibilities changed, see unit_coords(),
+                        a unit is appended for every change
+        _seen           _seen[k] = length of _dirty when strategies[k] last looked at the
+                        units, the strategy only looks at the units appended after it
+        _trail          None or, while recursive_solve() searches or sudoku_generator
+                        checks removals, list of (container, key, previous value) tuples
+                        for every change made to the state, see _undo()
+        _key            None or, while a search with a TranspositionTable runs, the
+                        Zobrist key of grid and the excluded digits, kept up to date by
+                        place()
+        _geometry       the lookup tables shared by all sudokus of the size, see _Geometry
+
+    _poss, the possibility counts, _queue and _dirty are set up once by _init_poss() and
+    are then kept up to date by place() and _remove_poss(), which also record their changes
+    on _trail. _dirty and _seen are not recorded, the search only takes back guesses made
+    after the propagation ran dry, when every strategy had seen every dirty unit.
+
+    Digit masks are integers where bit (n - 1) is set if the digit n is contained,
+    see ALL_DIGITS and the tables of _Geometry. Masks of up to 9 digits are looked up in
+    lists, for larger masks _MaskFunction computes them on lookup, only the tuples of
+    digits are kept in a bounded cache.
+
+    The attributes are slots, a Sudoku has no __dict__. To keep many states in memory,
+    e.g. the open branches of a search, store the bytes of snapshot() instead of copies.
     """
-    def __init__(self, other=None):
-        self.grid =     [[0]*9 for _ in range(9)]
-        self._boxes =  [[set() for _ in range(3)] for _ in range(3)]
-        self._rows =    [set() for _ in range(9)]
-        self._columns = [set() for _ in range(9)]
-        self._poss =   [[set() for _ in range(9)] for _ in range(9)]
-        self._possCRows =    [[0] * 9 for _ in range(9)]
-        self._possCColumns = [[0] * 9 for _ in range(9)]
-        self._possCBoxes =  [[[0] * 9 for _ in range(3)] for _ in range(3)]
+    __slots__ = ("grid", "box_size", "size", "solved", "guesses", "strategies", "observer",
+                 "variable_order", "value_order", "_boxes", "_rows", "_columns", "_poss",
+                 "_possCRows", "_possCColumns", "_possCBoxes", "_counts", "_free_cells",
+                 "_queue", "_dirty", "_seen", "_trail", "_key", "_geometry")
+
+    def __init__(self, other=None, box_size=3):
+        """
+        :param other:       Sudoku to copy, including its box size and the state of the
+                            solver
+        :param box_size:    width and height of a box if other is None
+        """
+        if other is not None:
+            box_size = other.box_size
+        geometry = self._geometry = _geometry(box_size)
+        size = geometry.size
+        self.box_size = box_size
+        self.size = size
+        self.grid =     [[0] * size for _ in range(size)]
+        self._boxes =  [[0] * box_size for _ in range(box_size)]
+        self._rows =    [0] * size
+        self._columns = [0] * size
+        self._poss =   [[0] * size for _ in range(size)]
+        self._possCRows =    [[0] * size for _ in range(size)]
+        self._possCColumns = [[0] * size for _ in range(size)]
+        self._possCBoxes =  [[[0] * size for _ in range(box_size)] for _ in range(box_size)]
+        self._counts = (self._possCColumns + self._possCRows
+                        + [counts for column in self._possCBoxes for counts in column])
+        self._free_cells = size * size
+        self._queue = deque()
+        self._dirty = []
+        self._seen = [0] * len(DEFAULT_STRATEGIES)
+        self._trail = None
+        self._key = None
         self.solved = False
+        self.guesses = 0
+        self.strategies = DEFAULT_STRATEGIES
+        self.observer = None
+        self.variable_order = DEFAULT_VARIABLE_ORDER
+        self.value_order = DEFAULT_VALUE_ORDER
         if other is not None:
-            for x in range(9):
-                for y in range(9):
-                    self.grid[x][y] = other.grid[x][y]
+            self.strategies = other.strategies
+            self.observer = other.observer
+            self.variable_order = other.variable_order
+            self.value_order = other.value_order
+            for x in range(size):
+                self.grid[x][:] = other.grid[x]
+                self._poss[x][:] = other._poss[x]
+            self._rows[:] = other._rows
+            self._columns[:] = other._columns
+            for bx in range(box_size):
+                self._boxes[bx][:] = other._boxes[bx]
+            for counts, other_counts in zip(self._counts, other._counts):
+                counts[:] = other_counts
+            self._free_cells = other._free_cells
+            self._queue.extend(other._queue)
+            self._dirty.extend(other._dirty)
+            self._seen = list(other._seen)
 
     def _reset_poss_counts(self):
         """
         resets _possCColumns, _possCRows and _possCBoxes
         """
-        for i in range(9):
-            for n in range(9):
-                self._possCColumns[i][n] = 0
-                self._possCRows[i][n] = 0
-
-        for i in range(3):
-            for j in range(3):
-                for n in range(9):
-                    self._possCBoxes[i][j][n] = 0
+        zeros = [0] * self.size
+        for counts in self._counts:
+            counts[:] = zeros
 
     def read_string(self, in_string):
         """
         read in sudoku from string
-        :param in_string:   string with digits which are written row by row,
-                            a ',' indicates the next digit,
-                            a ';' indicates a new row. zero symbolizes no value
-        """
-        x = 0
-        y = 0
-        for c in in_string:
-            if c == " " or c == "\n":
+        :param in_string:   string with numbers which are written row by row,
+                            a ',' indicates the next number,
+                            a ';' indicates a new row. zero symbolizes no value.
+                            Numbers may have several digits for sudokus with more than
+                            9 digits. A string without ',' and ';' is read as single
+                            line, see read_line().
+        :raise ValueError: if a number is not a digit of the sudoku
+        """
+        text = in_string.translate(_NO_WHITESPACE).replace("|", ",")
+        if "," not in text and ";" not in text:
+            self.read_line(text)
+            return
+        size = self.size
+        for y, row in enumerate(text.split(";")):
+            if not row:
                 continue
-            elif c == "," or c == "|":
-                x += 1
-            elif c == ";":
-                x = 0
-                y += 1
-            else:
-                self.grid[x][y] = int(c)
+            for x, number in enumerate(row.split(",")):
+                if number:
+                    n = int(number)
+                    if not 0 <= n <= size:
+                        raise ValueError("%s is not a digit of a %ix%i sudoku"
+                                         % (number, size, size))
+                    self.grid[x][y] = n
+        self._update_units()
+
+    def read_line(self, line):
+        """
+        read in sudoku from a single line
+        :param line:    string with the 81 (size ** 2) digits written row by row,
+                        zero or '.' symbolizes no value. The digits above 9 are written
+                        as letters, A for 10 up to P for 25, see SYMBOLS.
+        :raise ValueError: if the line does not contain size ** 2 digits
+        """
+        line = line.strip()
+        size = self.size
+        if len(line) != size * size:
+            raise ValueError("expected %i digits, got %i" % (size * size, len(line)))
+        values = line.encode("ascii", "replace").translate(_LINE_VALUES)
+        if max(values) > size:
+            c = next(c for c, n in zip(line, values) if n > size)
+            raise ValueError("%r is not a digit of a %ix%i sudoku" % (c, size, size))
+        # the line is written row by row, so every size-th value is in the same column
+        for x in range(size):
+            self.grid[x][:] = values[x::size]
+        self._update_units()
+
+    def to_line(self):
+        """
+        :return: the digits row by row in a single line, zero symbolizes no value
+                 (see read_line)
+        """
+        rows = zip(*self.grid)
+        return bytes(chain.from_iterable(rows)).translate(_LINE_SYMBOLS).decode("ascii")
+
+    def snapshot(self):
+        """
+        :return: SudokuState of the digits and the possibilities, e.g. of an open branch
+                 of a search. The possibilities are set up by solve() or recursive_solve(),
+                 a sudoku that has only been read has none.
+        """
+        digits = bytes(chain.from_iterable(zip(*self.grid)))
+        poss = array(_poss_typecode(self.size), chain.from_iterable(zip(*self._poss)))
+        return SudokuState(self.box_size, digits + poss.tobytes())
+
+    def restore(self, state):
+        """
+        Set the digits and the possibilities to those of a snapshot and set up the rest of
+        the state of the solver from them, like solve() does before it propagates.
+        :param state:   SudokuState of a sudoku of the same box size
+        :raise ValueError: if the state is of another box size
+        :raise IncorrectSudokuException: if a cell or a digit in a unit has no possibility
+        """
+        if state.box_size != self.box_size:
+            raise ValueError("the state is of a %ix%i sudoku" % (state.box_size ** 2,
+                                                                  state.box_size ** 2))
+        size = self.size
+        cells = size * size
+        poss = array(_poss_typecode(size))
+        poss.frombytes(state.data[cells:])
+        for x in range(size):
+            self.grid[x][:] = state.data[x:cells:size]
+            self._poss[x][:] = poss[x::size]
+        self.solved = False
         self._update_units()
+        self._update_poss_counts()
+        self._init_queue()
 
-    def recursive_solve(self):
+    def recursive_solve(self, engine="rules", max_nodes=None, deadline=None, cancel=None,
+                        table=None):
         """
         Solves the sudoku with regular strategies until it can not find any new digits.
-        Then it tries to find the solution by recursively "brute-forcing" the cells with
-        the fewest possibilities. If the sudoku is ambiguous, it uses one possible solution.
+        Then it tries to find the solution by "brute-forcing" the cells with the fewest
+        possibilities, see _solutions(). If the sudoku is ambiguous, it uses one
+        possible solution.
+        :param engine:  "rules" for the strategies described above or "dlx" to solve the
+                        sudoku as exact cover problem with Dancing Links (see sudoku_dlx),
+                        which stays fast on nearly empty puzzles. The engines may choose
+                        different solutions for ambiguous sudokus.
+        :param max_nodes:   largest number of guesses, None for no limit
+        :param deadline:    value of time.monotonic() at which the search gives up, None
+                            for no limit
+        :param cancel:      None or a CancelToken to stop the search from another thread
+        :param table:       None or a TranspositionTable of the rules engine, the grids
+                            proven to have no solution are skipped and added to it
         :raise IncorrectSudokuException: If the input sudoku has no solution.
+        :raise SolveBudgetExceeded: If the search ran out of nodes or time or was cancelled
+                                    before it found a solution. The grid is left as after
+                                    the propagation before the first guess.
+        """
+        budget = None
+        if max_nodes is not None or deadline is not None or cancel is not None:
+            budget = _Budget(max_nodes, deadline, cancel)
+        if engine == "dlx":
+            links = sudoku_dlx.DancingLinks(self.grid)
+            try:
+                placed = next(links.solutions(budget), None)
+            finally:
+                self.guesses = links.guesses
+            if placed is None:
+                raise IncorrectSudokuException()
+            for x, y, n in placed:
+                self.grid[x][y] = n
+            self.solved = True
+        elif engine == "rules":
+            self._init_poss()
+            solutions = self._solutions(budget, table)
+            stack = next(solutions, None)
+            solutions.close()
+            if stack is None:
+                raise IncorrectSudokuException()
+        else:
+            raise ValueError("unknown engine %r, expected one of %s" % (engine, ENGINES))
+
+    def count_solutions(self, limit=2, engine="rules", exclude=(), max_nodes=None,
+                        deadline=None, cancel=None, table=None):
+        """
+        Count the solutions of the sudoku with the search of recursive_solve(). The search
+        stops as soon as limit solutions have been found. The sudoku itself is not changed.
+        :param limit:   maximal number of solutions to count, None to count all of them
+        :param engine:  engine of the search, see recursive_solve()
+        :param exclude: iterable of (x, y, n) tuples, only solutions without the digit n in
+                        the empty cell (x, y) are counted
+        :param max_nodes, deadline, cancel: the budget of the search, see recursive_solve()
+        :param table:   None or a TranspositionTable of the rules engine, the grids with a
+                        known number of solutions are skipped and the completely searched
+                        ones are added to it
+        :return: the number of solutions, at most limit
+        :raise SolveBudgetExceeded: If the search ran out of its budget, the solutions found
+                                    so far are in its solutions attribute.
+        """
+        budget = None
+        if max_nodes is not None or deadline is not None or cancel is not None:
+            budget = _Budget(max_nodes, deadline, cancel)
+        if engine == "dlx":
+            searcher = sudoku_dlx.DancingLinks(self.grid, exclude)
+            solutions = searcher.solutions(budget)
+        elif engine == "rules":
+            exclude = tuple(exclude)
+            searcher = Sudoku(self)
+            self.guesses = 0
+            try:
+                searcher._init_poss()
+                for x, y, n in exclude:
+                    searcher._remove_poss(x, y, digit_bit(n))
+            except IncorrectSudokuException:
+                return 0
+            solutions = searcher._solutions(budget, table, True, exclude)
+        else:
+            raise ValueError("unknown engine %r, expected one of %s" % (engine, ENGINES))
+        count = 0
+        try:
+            for _ in islice(solutions, limit):
+                count += 1
+        except SolveBudgetExceeded as e:
+            e.solutions = count
+            raise
+        finally:
+            solutions.close()
+            # the search runs on a copy or on the links, the guesses are reported here
+            self.guesses = searcher.guesses
+        return count
+
+    def is_unique(self, engine="rules"):
+        """
+        :param engine:  engine of the search, see recursive_solve()
+        :return: True if the sudoku has exactly one solution
+        """
+        return self.count_solutions(2, engine) == 1
+
+    def _solutions(self, budget=None, table=None, counting=False, exclude=()):
         """
-        self.solve()
-        if not self.solved:
-            x, y = self._find_min_poss()
-            min_set = set(self._poss[x][y])
-            for n in min_set:
-                s = Sudoku(self)
-                s.grid[x][y] = n
+        Depth first search over the guesses, made on this object instead of copies of it.
+        While searching, every change to grid, the digit masks, _poss and the possibility
+        counts is recorded on _trail, so a wrong guess is taken back by undoing the trail
+        up to the mark of its branch. The branches are kept on an explicit stack instead of
+        the python call stack. If _trail is already recording, the search records on it
+        and leaves the changes of the search on it.
+        With a table, the grid of the sudoku and the grid after every guess are looked up
+        before they are searched and stored with their number of solutions once they have
+        been searched completely, see TranspositionTable.
+        :param budget:      None or a _Budget that is checked before every guess
+        :param table:       None or a TranspositionTable
+        :param counting:    True to skip all grids with an entry in the table, each of
+                            their solutions is yielded without being in grid, False to
+                            skip only the grids without solution
+        :param exclude:     the (x, y, n) tuples of the digits that have been excluded
+                            from the possibilities, they are part of the Zobrist key
+        :return: generator that yields whenever grid holds a solution, the value is the stack
+                 of branches: lists [x, y, digits to guess, index of the next digit to guess,
+                 length of _trail, _free_cells and _key before the guess, Zobrist key of
+                 the grid after the last guess or None, number of solutions found before
+                 the last guess]. The search continues with the next guess when the
+                 generator is resumed.
+        """
+        observer = self.observer
+        zobrist = self._geometry.zobrist
+        outer_trail = self._trail
+        self._trail = [] if outer_trail is None else outer_trail
+        self.guesses = 0
+        stack = []
+        # number of solutions found, including the solutions of the table entries
+        found = 0
+        try:
+            if table is not None:
+                root = self._key = self._zobrist_key(exclude)
+                known = table.get(root)
+                if known is not None and (counting or known == 0):
+                    yield from repeat(stack, known)
+                    return
+            try:
+                self._propagate()
+                consistent = True
+            except IncorrectSudokuException:
+                consistent = False
+            while True:
+                if consistent and self.solved:
+                    if observer is not None:
+                        observer.on_solution(len(stack))
+                    found += 1
+                    yield stack
+                    consistent = False
+                if observer is not None:
+                    start = time.perf_counter()
+                if consistent:
+                    stack.append(list(self._branch()) + [0, len(self._trail),
+                                                          self._free_cells, self._key,
+                                                          None, found])
+                # take back the last guess, drop the branches without digits left to guess
+                while stack:
+                    branch = stack[-1]
+                    if observer is not None and branch[3] != 0:
+                        observer.on_backtrack(len(stack))
+                    self._undo(branch[4], branch[5], branch[6])
+                    if table is not None:
+                        if branch[7] is not None:
+                            # the grid after the last guess has been searched completely
+                            table.store(branch[7], found - branch[8])
+                            branch[7] = None
+                        x, y, digits = branch[:3]
+                        while branch[3] < len(digits):
+                            known = table.get(branch[6] ^ zobrist[x][y][digits[branch[3]] - 1])
+                            if known is None or not (counting or known == 0):
+                                break
+                            branch[3] += 1
+                            found += known
+                            yield from repeat(stack, known)
+                    if branch[3] < len(branch[2]):
+                        break
+                    stack.pop()
+                else:
+                    break
+                x, y, digits, index = branch[:4]
+                if budget is not None:
+                    try:
+                        budget.check(self.guesses + 1, len(stack))
+                    except SolveBudgetExceeded:
+                        # leave the sudoku as it was before the first guess
+                        self._undo(stack[0][4], stack[0][5], stack[0][6])
+                        raise
+                branch[3] += 1
+                if table is not None:
+                    branch[7] = branch[6] ^ zobrist[x][y][digits[index] - 1]
+                    branch[8] = found
+                self.guesses += 1
+                if observer is not None:
+                    observer.on_guess(x, y, digits[index], len(digits), len(stack),
+                                      time.perf_counter() - start)
                 try:
-                    s.recursive_solve()
+                    self.place(x, y, digits[index])
+                    self._propagate()
+                    consistent = True
                 except IncorrectSudokuException:
-                    pass
-                if s.solved:
-                    print("'guessed' %i out of %i digits in %i %i" % (n, len(min_set), x, y))
-                    self.grid = s.grid
-                    self.solved = True
-                    break
-        if not self.solved:
-            raise IncorrectSudokuException()
+                    consistent = False
+            if table is not None:
+                table.store(root, found)
+        finally:
+            self._trail = outer_trail
+            self._key = None
+
+    def _zobrist_key(self, exclude=()):
+        """
+        :param exclude: (x, y, n) tuples of digits excluded from the empty cell (x, y)
+        :return: the Zobrist key of grid and the excluded digits, see _Geometry.zobrist
+        """
+        zobrist = self._geometry.zobrist
+        key = 0
+        for x, column in enumerate(self.grid):
+            for y, n in enumerate(column):
+                if n != 0:
+                    key ^= zobrist[x][y][n - 1]
+        for x, y, n in exclude:
+            key ^= zobrist[x][y][self.size + n - 1]
+        return key
+
+    def _undo(self, mark, free_cells, zobrist_key):
+        """
+        restore the state recorded on _trail until only mark entries are left
+        :param free_cells:  value of _free_cells at the mark
+        :param zobrist_key: value of _key at the mark
+        """
+        trail = self._trail
+        while len(trail) > mark:
+            container, key, value = trail.pop()
+            container[key] = value
+        self._free_cells = free_cells
+        self._key = zobrist_key
+        self._queue.clear()
+        self._dirty.clear()
+        self._seen = [0] * len(self.strategies)
+        self.solved = False
 
     def solve(self):
         """
@@ -104,39 +986,251 @@ class Sudoku:
         used in _solve_step()
         :return: whether the sudoku has been successfully solved
         """
+        self._init_poss()
+        return self._propagate()
+
+    def _propagate(self):
+        """
+        apply _solve_step() until no new digits are found
+        :return: whether the sudoku has been successfully solved
+        """
         while self._solve_step():
             pass
         return self.solved
 
+    def place(self, x, y, n):
+        """
+        Write the digit n into the empty cell (x, y) and remove it from the possibilities
+        of the peers of the cell (20 in a 9x9 sudoku). The possibility counts are updated
+        by delta, cells that are left with one possibility (only choice rule) and digits
+        that are left with one possible cell in a unit (single possibility rule) are added
+        to the work queue.
+        The possibilities have to be set up by solve() or recursive_solve() beforehand.
+        :raise IncorrectSudokuException: if n is not possible in the cell or if a cell or a
+                                         digit in a unit is left without possibility
+        """
+        bit = digit_bit(n)
+        if not self._poss[x][y] & bit:
+            raise IncorrectSudokuException()
+        geometry = self._geometry
+        boxes = self._boxes[x // geometry.box_size]
+        by = y // geometry.box_size
+        trail = self._trail
+        if trail is not None:
+            trail.append((self.grid[x], y, 0))
+            trail.append((self._rows, y, self._rows[y]))
+            trail.append((self._columns, x, self._columns[x]))
+            trail.append((boxes, by, boxes[by]))
+        self.grid[x][y] = n
+        if self._key is not None:
+            self._key ^= geometry.zobrist[x][y][n - 1]
+        self._free_cells -= 1
+        self._rows[y] |= bit
+        self._columns[x] |= bit
+        boxes[by] |= bit
+        self._remove_poss(x, y, geometry.all_digits)
+        for x2, y2 in geometry.peers[x][y]:
+            if self._poss[x2][y2] & bit:
+                self._remove_poss(x2, y2, bit)
+
+    def _remove_poss(self, x, y, mask):
+        """
+        remove the digits in mask from the possibilities of the cell (x, y), decrement
+        the possibility counts of its row, column and box, mark the units dirty and queue
+        the digits that can be found by the only choice or single possibility rule
+        afterwards
+        :return: True if a possibility was removed
+        :raise IncorrectSudokuException: if the empty cell or a digit in one of its units
+                                         is left without possibility
+        """
+        poss = self._poss[x][y]
+        removed = poss & mask
+        if not removed:
+            return False
+        trail = self._trail
+        if trail is not None:
+            trail.append((self._poss[x], y, poss))
+        poss ^= removed
+        self._poss[x][y] = poss
+        geometry = self._geometry
+        if self.grid[x][y] == 0:
+            if poss == 0:
+                raise IncorrectSudokuException()
+            if geometry.popcount[poss] == 1:
+                self._queue.append((x, y, geometry.lowest_digit[poss]))
+        units = geometry.cell_units[x][y]
+        self._dirty.extend(units)
+        column, row, box_unit = units
+        row_counts = self._counts[row]
+        column_counts = self._counts[column]
+        box_counts = self._counts[box_unit]
+        box = self._boxes[x // geometry.box_size][y // geometry.box_size]
+        box_cells = geometry.unit_cells[box_unit]
+        for n in geometry.digits[removed]:
+            if trail is not None:
+                trail.append((row_counts, n - 1, row_counts[n - 1]))
+                trail.append((column_counts, n - 1, column_counts[n - 1]))
+                trail.append((box_counts, n - 1, box_counts[n - 1]))
+            row_counts[n - 1] -= 1
+            column_counts[n - 1] -= 1
+            box_counts[n - 1] -= 1
+            self._check_poss_count(row_counts, self._rows[y], geometry.row_cells[y], n)
+            self._check_poss_count(column_counts, self._columns[x],
+                                   geometry.column_cells[x], n)
+            self._check_poss_count(box_counts, box, box_cells, n)
+        return True
+
+    def _check_poss_count(self, counts, unit, cells, n):
+        """
+        queue the last possible cell of the digit n in a unit (single possibility rule)
+        :param counts:  possibility counts of the unit, e.g. _possCRows[y]
+        :param unit:    digit mask of the unit, e.g. _rows[y]
+        :param cells:   coordinates of the cells in the unit, e.g. _geometry.row_cells[y]
+        :param n:       the digit to check
+        :raise IncorrectSudokuException: if n is not in the unit and has no possible cell left
+        """
+        if counts[n - 1] > 1 or unit & digit_bit(n):
+            return
+        if counts[n - 1] == 0:
+            raise IncorrectSudokuException()
+        for x, y in cells:
+            if self._poss[x][y] & digit_bit(n):
+                self._queue.append((x, y, n))
+                return
+
+    def _init_poss(self):
+        """
+        set up _rows, _columns, _boxes, _poss, the possibility counts and the work queue
+        from grid, all units are dirty
+        :raise IncorrectSudokuException: if a cell or a digit in a unit has no possibility
+        """
+        self._update_units()
+        self._fill_poss()
+        self._update_poss_counts()
+        self._init_queue()
+
+    def _init_queue(self):
+        """
+        set up the work queue and _free_cells from grid, _poss and the possibility counts,
+        all units are dirty
+        :raise IncorrectSudokuException: if a cell or a digit in a unit has no possibility
+        """
+        self._queue.clear()
+        self._dirty = list(range(3 * self.size))
+        self._seen = [0] * len(self.strategies)
+        self._free_cells = 0
+        geometry = self._geometry
+        size = self.size
+        for x in range(size):
+            for y in range(size):
+                if self.grid[x][y] == 0:
+                    self._free_cells += 1
+                    poss = self._poss[x][y]
+                    if poss == 0:
+                        raise IncorrectSudokuException()
+                    if geometry.popcount[poss] == 1:
+                        self._queue.append((x, y, geometry.lowest_digit[poss]))
+        for n in range(1, size + 1):
+            for i in range(size):
+                bx, by = divmod(i, self.box_size)
+                self._check_poss_count(self._possCRows[i], self._rows[i],
+                                       geometry.row_cells[i], n)
+                self._check_poss_count(self._possCColumns[i], self._columns[i],
+                                       geometry.column_cells[i], n)
+                self._check_poss_count(self._possCBoxes[bx][by], self._boxes[bx][by],
+                                       geometry.box_cells[bx][by], n)
+        self.solved = self._free_cells == 0
+
     def _find_min_poss(self):
         """
-        find one of the cells with the fewest count of possibilities
+        find the first cell, in the order of grid, with the fewest count of possibilities
+        (minimum remaining values). The counts of a column are looked up at once and the
+        scan stops at a cell with 2 possibilities, as the propagation leaves no cell with
+        a single one.
         :return: tuple of indexes (x, y)
         """
-        minx, miny = 0, 0
-        minlen = 9
-        for x in range(9):
-            for y in range(9):
-                if len(self._poss[x][y]) != 0 and len(self._poss[x][y]) < minlen:
-                    minlen = len(self._poss[x][y])
-                    minx, miny = x, y
-        return minx, miny
+        popcount = self._geometry.popcount
+        best, fewest = None, self.size + 1
+        for x, column in enumerate(self._poss):
+            counts = list(map(popcount.__getitem__, column))
+            count = min(filter(None, counts), default=fewest)
+            if count < fewest:
+                best, fewest = (x, counts.index(count)), count
+                if count <= 2:
+                    break
+        return best
+
+    def _find_min_poss_degree(self):
+        """
+        find the cell with the fewest count of possibilities, of these the one with the
+        most empty peers (degree), which constrains the most cells. Ties are broken by
+        the order of grid.
+        :return: tuple of indexes (x, y)
+        """
+        x, y = self._find_min_poss()
+        geometry = self._geometry
+        popcount = geometry.popcount
+        poss = self._poss
+        count = popcount[poss[x][y]]
+        best, best_degree = None, -1
+        for x, column in enumerate(poss):
+            for y, cell_poss in enumerate(column):
+                if popcount[cell_poss] != count:
+                    continue
+                degree = 0
+                for x2, y2 in geometry.peers[x][y]:
+                    if poss[x2][y2]:
+                        degree += 1
+                if degree > best_degree:
+                    best, best_degree = (x, y), degree
+        return best
+
+    def _ascending_digits(self, x, y):
+        """
+        :return: the possibilities of the cell (x, y) in ascending order
+        """
+        return self._geometry.digits[self._poss[x][y]]
+
+    def _least_constraining_digits(self, x, y):
+        """
+        :return: the possibilities of the cell (x, y), the digits that are possible in the
+                 fewest peers first (least constraining value), which leave the most
+                 possibilities to the peers
+        """
+        poss = self._poss
+        peers = self._geometry.peers[x][y]
+
+        def constrained(n):
+            bit = digit_bit(n)
+            return sum(1 for x2, y2 in peers if poss[x2][y2] & bit)
+
+        return sorted(self._ascending_digits(x, y), key=constrained)
+
+    def _rarest_digits(self, x, y):
+        """
+        :return: the possibilities of the cell (x, y), the digits with the fewest possible
+                 cells in the column, row or box of the cell first, according to the
+                 possibility counts. Such a digit is more likely the one of the cell.
+        """
+        units = [self._counts[unit] for unit in self._geometry.cell_units[x][y]]
+        return sorted(self._ascending_digits(x, y),
+                      key=lambda n: min(counts[n - 1] for counts in units))
+
+    def _branch(self):
+        """
+        choose the cell to guess in and the order of the digits to guess by the policies
+        variable_order and value_order
+        :return: tuple (x, y, sequence of the digits to guess)
+        """
+        x, y = VARIABLE_ORDERS[self.variable_order](self)
+        return x, y, VALUE_ORDERS[self.value_order](self, x, y)
 
     def __str__(self):
         """
         :return: the comma separated digits row by row
         """
-        out = ""
-        for y in range(9):
-            for x in range(9):
-                digit = self.grid[x][y]
-                if digit != 0:
-                    out += str(digit)
-                else:
-                    out += " "
-                out += ", "
-            out = out[:-2] + ";\n"
-        return out
+        return "".join(", ".join([_CELL_TEXT[n] for n in row]) + ";\n"
+                       for row in zip(*self.grid))
 
     def _solve_step(self):
         """
@@ -145,89 +1239,130 @@ class Sudoku:
         the Sub-Group exclusion rule and
         the Hidden Twin exclusion rule
         (see http://www.sudokudragon.com/sudokustrategy.htm)
+        The digits found by the only choice and single possibility rule are taken from the
+        work queue, the exclusion rules in strategies only remove possibilities and may
+        fill the queue for the next step. Each strategy only looks at the dirty units whose
+        possibilities changed since it last looked at them. When a strategy changes the
+        sudoku, the strategies are tried again from the first one, so the later, more
+        expensive ones only run when the earlier ones found nothing. This ends when no
+        strategy changes the sudoku or digits have been found.
         :return: True if a new digit has been found
         """
-        self._update_units()
-        self._fill_poss()
-
-        while True:
-            change = False
-            if self._hidden_twin():
-                change = True
-
-            self._update_poss_counts()
-            if self._subgroup_exclusion():
-                change = True
+        observer = self.observer
+        place = self.place if observer is None else partial(self._observed_place, observer)
+        progressing = False
+        while self._queue:
+            x, y, n = self._queue.popleft()
+            if self.grid[x][y] != n:
+                place(x, y, n)
+                progressing = True
 
-            if not change:
+        dirty = self._dirty
+        seen = self._seen
+        while not self._queue:
+            for k, name in enumerate(self.strategies):
+                if seen[k] == len(dirty):
+                    continue
+                units = set(dirty[seen[k]:])
+                seen[k] = len(dirty)
+                rule = partial(STRATEGIES[name], self, units)
+                if observer is None:
+                    change = rule()
+                else:
+                    change = self._observed_rule(observer, name, rule)
+                if change:
+                    break
+            else:
+                # every strategy has seen every unit
+                dirty.clear()
+                seen[:] = [0] * len(seen)
                 break
-        progressing = False
-        solved = True
-        for x in range(9):
-            for y in range(9):
-                if self.grid[x][y] == 0:
-                    solved = False
-                    if len(self._poss[x][y]) == 0:
-                        raise IncorrectSudokuException()
+        self.solved = self._free_cells == 0
+        return progressing or len(self._queue) != 0
 
-                    # only choice rule
-                    if len(self._poss[x][y]) == 1:
-                        self.grid[x][y] = self._poss[x][y].pop()
-                        # print("%i %i only poss in cell %i" % (x, y,  self.grid[x][y]))
-                        progressing = True
-                        continue
-
-                    # single possibility rule
-                    for n in self._poss[x][y]:
-                        if self._possCRows[y][n - 1] == 1 or \
-                           self._possCColumns[x][n - 1] == 1 or \
-                           self._possCBoxes[x//3][y//3][n - 1] == 1:
-                            self.grid[x][y] = n
-                            # print("%i %i only poss in container %i" % (x, y,  self.grid[x][y]))
-                            progressing = True
-                            continue
-        self.solved = solved
-        return progressing
+    def _observed_place(self, observer, x, y, n):
+        """
+        place(x, y, n) for a digit of the work queue, reported to the observer
+        """
+        if self._geometry.popcount[self._poss[x][y]] == 1:
+            rule = "only_choice"
+        else:
+            rule = "single_possibility"
+        start = time.perf_counter()
+        try:
+            self.place(x, y, n)
+        finally:
+            observer.on_rule(rule, time.perf_counter() - start, True)
+
+    @staticmethod
+    def _observed_rule(observer, name, rule):
+        """
+        call rule() and report it to the observer
+        :return: the result of rule()
+        """
+        changed = False
+        start = time.perf_counter()
+        try:
+            changed = rule()
+        finally:
+            observer.on_rule(name, time.perf_counter() - start, changed)
+        return changed
 
     def _update_units(self):
         """
         Update the values in _rows, _columns and _boxes
         """
+        b = self.box_size
+        for i in range(self.size):
+            self._rows[i] = 0
+            self._columns[i] = 0
+            self._boxes[i // b][i % b] = 0
         # update rows and columns and boxes
-        for x in range(9):
-            for y in range(9):
+        for x in range(self.size):
+            for y in range(self.size):
                 n = self.grid[x][y]
                 if n != 0:
-                    self._rows[y].add(n)
-                    self._columns[x].add(n)
-                    self._boxes[x // 3][y // 3].add(n)
+                    bit = digit_bit(n)
+                    self._rows[y] |= bit
+                    self._columns[x] |= bit
+                    self._boxes[x // b][y // b] |= bit
 
     def _update_poss_counts(self):
         """
         update the values in _possCRows, _possCColumns and _possCBoxes
         """
         self._reset_poss_counts()
-        for x in range(9):
-            for y in range(9):
-                if self.grid[x][y] == 0:
-                    for n in self._poss[x][y]:
-                        self._possCRows[y][n - 1] += 1
-                        self._possCColumns[x][n - 1] += 1
-                        self._possCBoxes[x // 3][y // 3][n - 1] += 1
+        geometry = self._geometry
+        digits = geometry.digits
+        counts = self._counts
+        for x, column in enumerate(self.grid):
+            column_counts = counts[x]
+            poss = self._poss[x]
+            cell_units = geometry.cell_units[x]
+            for y, value in enumerate(column):
+                if value == 0:
+                    _, row, box = cell_units[y]
+                    row_counts = counts[row]
+                    box_counts = counts[box]
+                    for n in digits[poss[y]]:
+                        column_counts[n - 1] += 1
+                        row_counts[n - 1] += 1
+                        box_counts[n - 1] += 1
 
     def _fill_poss(self):
         """
         update the values in _poss
         :return:
         """
-        alln = set([x for x in range(1, 10)])
-        for x in range(9):
-            for y in range(9):
+        b = self.box_size
+        all_digits = self._geometry.all_digits
+        for x in range(self.size):
+            for y in range(self.size):
                 if self.grid[x][y] == 0:
-                    self._poss[x][y] = alln - self._rows[y] - self._columns[x] \
-                                       - self._boxes[x // 3][y // 3]
+                    self._poss[x][y] = all_digits & ~(self._rows[y] | self._columns[x]
+                                                      | self._boxes[x // b][y // b])
                 else:
-                    self._poss[x][y].clear()
+                    self._poss[x][y] = 0
 
     @staticmethod
     def col_coords(i, j):
@@ -240,115 +1375,272 @@ class Sudoku:
         return j, i
 
     @staticmethod
-    def box_coords(i, j):
-        """:returns i and j transformed into box coordinates"""
-        return (i // 3) * 3 + j // 3, (i % 3) * 3 + j % 3
+    def box_coords(i, j, box_size=3):
+        """
+        :param box_size:    box size of the sudoku, see unit_coords() for a function that
+                            knows the box size of an instance
+        :returns i and j transformed into box coordinates
+        """
+        b = box_size
+        return (i // b) * b + j // b, (i % b) * b + j % b
+
+    def unit_coords(self, unit):
+        """
+        :param unit:    index of a unit, 0 to size - 1 for the columns, size to 2 * size - 1
+                        for the rows and 2 * size to 3 * size - 1 for the boxes
+        :return: tuple (coords, i) of the coordinate function and the index to pass to it
+        """
+        kind, i = divmod(unit, self.size)
+        if kind == 2:
+            return partial(self.box_coords, box_size=self.box_size), i
+        return (self.col_coords, self.row_coords)[kind], i
 
-    def _hidden_twin(self):
+    def _hidden_twin(self, units):
         """
         try apply the hidden twin rule to rows, columns or boxes
         the rule itself if implemented in _hidden_twin_step
+        :param units:   iterable of the unit indexes to look at, see unit_coords()
         :return: True if the rule was applied
         """
         changed = False
-        for i in range(9):
-            for j in range(9):
-                if self._hidden_twin_step(self.col_coords, i, j):
-                    changed = True
-                if self._hidden_twin_step(self.row_coords, i, j):
-                    changed = True
-                if self._hidden_twin_step(self.box_coords, i, j):
-                    changed = True
+        unit_cells = self._geometry.unit_cells
+        for unit in units:
+            if self._hidden_twin_step(unit_cells[unit]):
+                changed = True
         return changed
 
-    def _hidden_twin_step(self, coords, i, j):
+    def _hidden_twin_step(self, cells):
         """
         Apply the Hidden Twin rule described at www.sudokudragon.com/sudokustrategy.htm.
         If there are 2 cells inside a container(row/column/box) witch have the same pair
         of possibilities, the to digits in the pair can not be anywhere else in the
         container.
-        :param coords: function that defines how the i and j parameters should be
-                       transformed to get the x and y coordinate. This parameter makes it
-                       possible to apply this function to rows, columns and boxes
-        :param i: first offset of the cell
-        :param j: second offset of the cell
+        The pairs are looked up in a dict, so a container is scanned once instead of
+        comparing every pair of cells, which matters for the larger sudokus.
+        :param cells:   coordinates of the cells of the container, see
+                        _Geometry.unit_cells
         :return: True if the rule was successfully applied
         """
         changed = False
-        x, y = coords(i, j)
-        # check if there is a pair at the given offset
-        if len(self._poss[x][y]) == 2:
-            # search for cell with the same pair
-            for j2 in range(j + 1, 9):
-                x2, y2 = coords(i, j2)
-                if self._poss[x][y] == self._poss[x2][y2]:
-                    # cell with same pair is cell (i, j2)
-                    pair = self._poss[x][y]
-                    # remove all occurrences of the paired digits in the sequence
-                    # which are not the pairs themselves
-                    for j3 in range(9):
-                        if j3 != j and j3 != j2:
-                            x3, y3 = coords(i, j3)
-                            if not self._poss[x3][y3].isdisjoint(pair):
-                                self._poss[x3][y3] -= pair
-                                changed = True
-                    break
+        popcount = self._geometry.popcount
+        poss = self._poss
+        # first[pair] = offset of the first cell with the pair of possibilities
+        first = {}
+        for j, (x, y) in enumerate(cells):
+            pair = poss[x][y]
+            if popcount[pair] != 2:
+                continue
+            j1 = first.setdefault(pair, j)
+            if j1 == j:
+                continue
+            # remove all occurrences of the paired digits in the sequence
+            # which are not the pairs themselves
+            for j3, (x3, y3) in enumerate(cells):
+                if j3 != j1 and j3 != j and self._remove_poss(x3, y3, pair):
+                    changed = True
         return changed
 
-    def _subgroup_exclusion(self):
+    def _subgroup_exclusion(self, units):
         """
         Apply the Subgroup exclusion rule. (see www.sudokudragon.com/sudokustrategy.htm)
-        Must be applied repeatedly since the possibility counts do not get updated inside
-        the function.
+        The rule only depends on the possibilities inside a box, so it is applied to the
+        rows and columns crossing the boxes among units.
+        :param units:   iterable of the unit indexes to look at, see unit_coords()
         :return: True if the rule was successfully applied
         """
         changed = False
-        # for each row/column
-        for i in range(9):
-            # for each box that crosses the row/column
-            for boxIndex in range(3):
-                if self._subgroup_exclusion_step(self.col_coords, i, boxIndex):
-                    changed = True
-                if self._subgroup_exclusion_step(self.row_coords, i, boxIndex):
+        first_box = 2 * self.size
+        subgroups = self._geometry.subgroups
+        for unit in units:
+            if unit < first_box:
+                continue
+            box_counts = self._counts[unit]
+            # for each row/column that crosses the box
+            for inside, outside in subgroups[unit - first_box]:
+                if self._subgroup_exclusion_step(inside, outside, box_counts):
                     changed = True
         return changed
 
-    def _subgroup_exclusion_step(self, coords, i, box_index):
+    def _subgroup_exclusion_step(self, inside, outside, box_counts):
         """
         Apply the subgroup exclusion rule on a single subgroup
         Subgroups are 3-cell columns or rows inside boxes
         Are the cells of  a subgroup the only place in a box where a digit can be,
         then the digit CAN NOT be anywhere in the full row/column the subgroup is part of
-        :param coords:      function that defines how the i and j parameters should be
-                            transformed to get the x and y coordinate. This parameter makes it
-                            possible to apply this function to rows, columns and boxes
-        :param i:           index of the row or column
-        :param box_index:    index of the box the row/column is crossing
-        :return:
+        :param inside:      coordinates of the cells of the subgroup
+        :param outside:     coordinates of the cells of the row/column outside the box
+        :param box_counts:  possibility counts of the box, e.g. _possCBoxes[bx][by]
+        :return: True if the rule was successfully applied
         """
         changed = False
+        digits = self._geometry.digits
+        poss = self._poss
         # poss_c[digit - 1] = count of possible cells for "digit"
         #                     in the current subgroup
-        poss_c = [0]*9
-        # for each cell in the subgroup
-        for k in range(3):
-            # sum up the count of possibilities for each digit in cells of the subgroup
-            x, y = coords(i, 3 * box_index + k)
-            for n in self._poss[x][y]:
+        poss_c = [0] * self.size
+        # mask of all digits that are possible somewhere in the subgroup
+        subgroup_poss = 0
+        # sum up the count of possibilities for each digit in cells of the subgroup
+        for x, y in inside:
+            cell_poss = poss[x][y]
+            subgroup_poss |= cell_poss
+            for n in digits[cell_poss]:
                 poss_c[n-1] += 1
-        for digit, count in enumerate(poss_c, 1):
+        for digit in digits[subgroup_poss]:
             # if all possibilities of a digit are in the subgroup, remove the
             # digit from the possibilities of the cells in the column and outside the box
-            x, y = coords(i // 3, box_index)
-            if count != 0 and count == self._possCBoxes[x][y][digit-1]:
-                changed = False
-                for j in range(9):
-                    x2, y2 = coords(i, j)
-                    if j//3 != box_index and digit in self._poss[x2][y2]:
+            if poss_c[digit-1] == box_counts[digit-1]:
+                bit = digit_bit(digit)
+                for x, y in outside:
+                    if poss[x][y] & bit and self._remove_poss(x, y, bit):
                         changed = True
-                        self._poss[x2][y2].remove(digit)
         return changed
 
+    def _naked_subset(self, units):
+        """
+        Apply the naked subset rule: if the possibilities of k cells of a unit are only k
+        digits (2 <= k <= MAX_SUBSET), these digits can not be anywhere else in the unit.
+        The hidden twin rule is the naked subset rule for k = 2.
+        :param units:   iterable of the unit indexes to look at, see unit_coords()
+        :return: True if the rule was successfully applied
+        """
+        changed = False
+        popcount = self._geometry.popcount
+        for unit in units:
+            cells = self._geometry.unit_cells[unit]
+            masks = [(j, self._poss[x][y]) for j, (x, y) in enumerate(cells)]
+            for group, digits in _subsets(masks, MAX_SUBSET, popcount):
+                for j, (x, y) in enumerate(cells):
+                    if j not in group and self._remove_poss(x, y, digits):
+                        changed = True
+        return changed
+
+    def _hidden_subset(self, units):
+        """
+        Apply the hidden subset rule: if k digits of a unit are only possible in the same
+        k cells (2 <= k <= MAX_SUBSET), these cells can not hold any other digit.
+        :param units:   iterable of the unit indexes to look at, see unit_coords()
+        :return: True if the rule was successfully applied
+        """
+        changed = False
+        geometry = self._geometry
+        for unit in units:
+            cells = geometry.unit_cells[unit]
+            # positions[n] = mask of the offsets j of the cells where n is possible
+            positions = {}
+            for j, (x, y) in enumerate(cells):
+                for n in geometry.digits[self._poss[x][y]]:
+                    positions[n] = positions.get(n, 0) | 1 << j
+            for group, where in _subsets(list(positions.items()), MAX_SUBSET,
+                                         geometry.popcount):
+                others = geometry.all_digits
+                for n in group:
+                    others &= ~digit_bit(n)
+                for j, (x, y) in enumerate(cells):
+                    if where >> j & 1 and self._remove_poss(x, y, others):
+                        changed = True
+        return changed
+
+    def _x_wing(self, units):
+        """
+        Apply the X-Wing rule, the fish rule with 2 lines, see _fish().
+        """
+        return self._fish(2)
+
+    def _swordfish(self, units):
+        """
+        Apply the Swordfish rule, the fish rule with up to 3 lines, see _fish().
+        """
+        return self._fish(3)
+
+    def _fish(self, lines):
+        """
+        Apply the fish rule: if the digit n is only possible in the same k columns of k rows
+        (2 <= k <= lines), one of these rows holds n in each of the columns, so n can not be
+        anywhere else in the columns. The same holds with rows and columns exchanged.
+        The rule looks at all rows and columns, as the lines of a fish are spread over the
+        sudoku.
+        :param lines:   largest number of rows (columns) of a fish
+        :return: True if the rule was successfully applied
+        """
+        changed = False
+        size = self.size
+        geometry = self._geometry
+        # column_masks[n - 1][x] = mask of the rows y of column x where n is possible,
+        # row_masks[n - 1][y] = mask of the columns x of row y where n is possible
+        column_masks = [[0] * size for _ in range(size)]
+        row_masks = [[0] * size for _ in range(size)]
+        for x in range(size):
+            for y in range(size):
+                for n in geometry.digits[self._poss[x][y]]:
+                    column_masks[n - 1][x] |= 1 << y
+                    row_masks[n - 1][y] |= 1 << x
+        for n in range(1, size + 1):
+            bit = digit_bit(n)
+            for line_cells, masks in ((geometry.column_cells, column_masks[n - 1]),
+                                      (geometry.row_cells, row_masks[n - 1])):
+                for group, where in _subsets(list(enumerate(masks)), lines,
+                                             geometry.popcount):
+                    for i in range(size):
+                        if i in group:
+                            continue
+                        for j, (x, y) in enumerate(line_cells[i]):
+                            if where >> j & 1 and self._remove_poss(x, y, bit):
+                                changed = True
+        return changed
+
+
+def _subsets(masks, max_size, popcount):
+    """
+    Find the groups of k masks whose union has exactly k bits, for 2 <= k <= max_size.
+    Masks with less than 2 or more than max_size bits are never part of a group, and a
+    group is not extended once it has been found.
+    :param masks:       list of (key, mask) tuples
+    :param max_size:    largest size of a group
+    :param popcount:    popcount table of the masks, see _Geometry
+    :return: generator of (list of the keys of a group, union of its masks) tuples
+    """
+    masks = [(key, mask) for key, mask in masks if 2 <= popcount[mask] <= max_size]
+    group = []
+
+    def extend(start, union):
+        for index in range(start, len(masks)):
+            key, mask = masks[index]
+            combined = union | mask
+            count = popcount[combined]
+            if count > max_size:
+                continue
+            group.append(key)
+            if count == len(group):
+                yield list(group), combined
+            elif len(group) < max_size:
+                yield from extend(index + 1, combined)
+            group.pop()
+
+    return extend(0, 0)
+
+
+#: the exclusion rules that Sudoku.strategies can name, more strategies can be added as
+#: functions (sudoku, units) -> True if the sudoku was changed, where units is the set of
+#: the units that are dirty for the strategy, see Sudoku.unit_coords()
+STRATEGIES = {"hidden_twin": Sudoku._hidden_twin,
+              "subgroup_exclusion": Sudoku._subgroup_exclusion,
+              "naked_subset": Sudoku._naked_subset,
+              "hidden_subset": Sudoku._hidden_subset,
+              "x_wing": Sudoku._x_wing,
+              "swordfish": Sudoku._swordfish}
+
+#: the policies that Sudoku.variable_order can name, functions (sudoku) -> (x, y) of the
+#: empty cell the search guesses in next
+VARIABLE_ORDERS = {"mrv": Sudoku._find_min_poss,
+                   "mrv_degree": Sudoku._find_min_poss_degree}
+
+#: the policies that Sudoku.value_order can name, functions (sudoku, x, y) -> sequence of
+#: the possibilities of the cell (x, y) in the order the search guesses them
+VALUE_ORDERS = {"ascending": Sudoku._ascending_digits,
+                "lcv": Sudoku._least_constraining_digits,
+                "frequency": Sudoku._rarest_digits}
+
 
 if __name__ == "__main__":
     sudoku = Sudoku()
@@ -364,5 +1656,8 @@ if __name__ == "__main__":
             " ,  ,  , 3, 2,  ,  ,  ,  ;\n"
 
     sudoku.read_string(instr)
+    sudoku.observer = SolveStats()
     sudoku.recursive_solve()
     print(sudoku)
+    for key, value in sudoku.observer.as_dict().items():
+        print("%-30s %s" % (key, value))
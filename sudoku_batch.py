@@ -0,0 +1,212 @@
+import numpy as np
+
+from sudoku import Sudoku, IncorrectSudokuException
+from sudoku_io import PACKED_SIZE
+
+# The batch works on arrays of N puzzles. Cells are numbered row by row, cell = 9 * y + x,
+# digits are stored as 0..8 in the last axis of the candidate tensor, so
+#   candidates[p, cell, n - 1] is True if the digit n is possible in the cell of puzzle p
+# Filled cells keep exactly their own digit as candidate. Reshaped to
+# (N, 3, 3, 3, 3, 9) the axes are [puzzle, band, y in band, stack, x in stack, digit],
+# so rows, columns and boxes are sums over (3, 4), (1, 2) and (2, 4).
+#: _BITS[n - 1] = bit of the digit n in a candidate code
+_BITS = 1 << np.arange(9, dtype=np.int16)
+
+
+def read_lines(lines):
+    """
+    :param lines:   iterable of lines with 81 digits written row by row,
+                    zero or '.' symbolizes no value
+    :return: (N, 81) int8 array of the puzzles, characters that are no digit are out of
+             the range of the digits, see solve_batch()
+    :raise ValueError: if a line does not contain 81 characters, e.g. of a 16x16 puzzle
+    """
+    lines = [line.strip() for line in lines]
+    for line in lines:
+        if len(line) != 81:
+            raise ValueError("expected 81 digits, got %i" % len(line))
+    data = "".join(lines).replace(".", "0")
+    puzzles = np.frombuffer(data.encode("ascii", "replace"), dtype=np.uint8).reshape(-1, 81)
+    return (puzzles - ord("0")).astype(np.int8)
+
+
+def to_lines(puzzles):
+    """
+    :param puzzles: (N, 81) array of digits
+    :return: list of lines with 81 digits each
+    """
+    data = (np.asarray(puzzles, dtype=np.uint8) + ord("0")).tobytes().decode("ascii")
+    return [data[i:i + 81] for i in range(0, len(data), 81)]
+
+
+def read_packed(path):
+    """
+    :param path:    file in the packed format of sudoku_io
+    :return: (N, 81) int8 array of the puzzles
+    """
+    data = np.fromfile(path, dtype=np.uint8).reshape(-1, PACKED_SIZE)
+    puzzles = np.empty((len(data), 2 * PACKED_SIZE), dtype=np.int8)
+    puzzles[:, 0::2] = data >> 4
+    puzzles[:, 1::2] = data & 0xF
+    return puzzles[:, :81]
+
+
+def write_packed(path, puzzles):
+    """
+    write puzzles in the packed format of sudoku_io
+    :param puzzles: (N, 81) array of digits
+    """
+    values = np.zeros((len(puzzles), 2 * PACKED_SIZE), dtype=np.uint8)
+    values[:, :81] = puzzles
+    ((values[:, 0::2] << 4) | values[:, 1::2]).tofile(path)
+
+
+def solve_batch(puzzles):
+    """
+    Solve many puzzles at once. The rules of Sudoku._solve_step, the only choice rule,
+    the single possibility rule, the subgroup exclusion rule and the hidden twin rule,
+    are applied to the whole batch with array operations until no puzzle makes progress.
+    Only the puzzles that are not solved by these rules are handed to
+    Sudoku.recursive_solve one by one.
+    :param puzzles: (N, 81) array-like with the digits row by row, zero symbolizes no value
+    :return: tuple (solutions, solved), solutions is a (N, 81) int8 array, solved is a
+             boolean array which is False for puzzles without a solution
+    :raise ValueError: if a value is not a digit of a 9x9 sudoku, the tables of the batch
+                       only have 9 digits
+    """
+    values = np.array(puzzles, dtype=np.int8).reshape(-1, 81)
+    invalid = (values < 0) | (values > 9)
+    if invalid.any():
+        p, cell = np.argwhere(invalid)[0]
+        raise ValueError("puzzle %i: %i is not a digit of a 9x9 sudoku"
+                         % (p, values[p, cell]))
+    candidates = _candidates(values)
+    failed = propagate(candidates)
+    values = _values(candidates)
+
+    solved = ~failed & (values != 0).all(axis=1)
+    for p in np.flatnonzero(~failed & ~solved):
+        sudoku = Sudoku()
+        for cell in range(81):
+            sudoku.grid[cell % 9][cell // 9] = int(values[p, cell])
+        try:
+            sudoku.recursive_solve()
+        except IncorrectSudokuException:
+            continue
+        for cell in range(81):
+            values[p, cell] = sudoku.grid[cell % 9][cell // 9]
+        solved[p] = True
+    return values, solved
+
+
+def propagate(candidates):
+    """
+    apply the rules of Sudoku._solve_step to a batch of candidate tensors in place until
+    none of the puzzles changes any more
+    :param candidates:  (N, 81, 9) boolean candidate tensor
+    :return: boolean array, True for the puzzles that have no solution
+    """
+    failed = np.zeros(len(candidates), dtype=bool)
+    active = np.arange(len(candidates))
+    while len(active):
+        cand = candidates[active]
+        before = cand.copy()
+        bad = _step(cand)
+        candidates[active] = cand
+        failed[active] |= bad
+        changed = (cand != before).any(axis=(1, 2))
+        active = active[changed & ~bad]
+    return failed
+
+
+def _candidates(values):
+    """
+    :param values:  (N, 81) array of digits, zero for empty cells
+    :return: (N, 81, 9) candidate tensor with the digits placed
+    """
+    candidates = np.ones(values.shape + (9,), dtype=bool)
+    filled = values != 0
+    candidates[filled] = np.eye(9, dtype=bool)[values[filled] - 1]
+    return candidates
+
+
+def _values(candidates):
+    """
+    :return: (N, 81) int8 array with the digit of every cell with a single candidate
+    """
+    single = candidates.sum(axis=2, dtype=np.int8) == 1
+    return np.where(single, candidates.argmax(axis=2) + 1, 0).astype(np.int8)
+
+
+def _step(cand):
+    """
+    one step of the batch propagation on cand in place
+    :param cand:    (M, 81, 9) boolean candidate tensor
+    :return: boolean array, True for the puzzles that turned out to have no solution
+    """
+    m = len(cand)
+    single = cand.sum(axis=2, dtype=np.int8) == 1
+    placed = (cand & single[:, :, None]).reshape(m, 3, 3, 3, 3, 9).astype(np.int8)
+
+    # a digit placed in a cell is not possible in its peers (only choice rule), a digit
+    # placed twice in a unit leaves both cells without candidate
+    in_units = placed.sum(axis=(3, 4), keepdims=True) + placed.sum(axis=(1, 2), keepdims=True) \
+        + placed.sum(axis=(2, 4), keepdims=True) - 3 * placed
+    cand &= (in_units == 0).reshape(m, 81, 9)
+
+    # single possibility rule: a digit possible in only one cell of a unit goes there
+    cand4 = cand.reshape(m, 9, 9, 9)                 # [puzzle, y, x, digit]
+    hidden = cand4 & (cand4.sum(axis=2, dtype=np.int8) == 1)[:, :, None, :]
+    hidden |= cand4 & (cand4.sum(axis=1, dtype=np.int8) == 1)[:, None, :, :]
+    cand6 = cand.reshape(m, 3, 3, 3, 3, 9)          # [puzzle, band, y, stack, x, digit]
+    box_single = cand6.sum(axis=(2, 4), dtype=np.int8) == 1
+    hidden |= (cand6 & box_single[:, :, None, :, None, :]).reshape(m, 9, 9, 9)
+    hidden = hidden.reshape(m, 81, 9)
+    hidden_count = hidden.sum(axis=2, dtype=np.int8)
+    found = (hidden_count != 0) & ~single
+    cand[found] = hidden[found]
+
+    # subgroup exclusion: if the digit is only possible in one row (column) of a box, it
+    # is not possible in that row (column) outside of the box
+    cand6 = cand.reshape(m, 3, 3, 3, 3, 9)
+    in_row = cand6.any(axis=4)                       # [puzzle, band, y, stack, digit]
+    pointing = in_row & (in_row.sum(axis=2, dtype=np.int8) == 1)[:, :, None, :, :]
+    others = pointing.sum(axis=3, keepdims=True, dtype=np.int8) - pointing > 0
+    cand6 &= ~others[:, :, :, :, None, :]
+    in_column = cand6.any(axis=2)                    # [puzzle, band, stack, x, digit]
+    pointing = in_column & (in_column.sum(axis=3, dtype=np.int8) == 1)[:, :, :, None, :]
+    others = pointing.sum(axis=1, keepdims=True, dtype=np.int8) - pointing > 0
+    cand6 &= ~others[:, :, None, :, :, :]
+
+    # hidden twin rule: the digits of two cells with the same pair of candidates in a
+    # unit are not possible in the other cells of the unit
+    code = (cand * _BITS).sum(axis=2, dtype=np.int16)
+    code[cand.sum(axis=2, dtype=np.int8) != 2] = 0
+    code6 = code.reshape(m, 3, 3, 3, 3)              # [puzzle, band, y, stack, x]
+    removed = _twin_removals(code.reshape(m, 9, 9)).reshape(m, 81)
+    removed |= _twin_removals(code6.transpose(0, 3, 4, 1, 2).reshape(m, 9, 9)) \
+        .reshape(m, 3, 3, 3, 3).transpose(0, 3, 4, 1, 2).reshape(m, 81)
+    removed |= _twin_removals(code6.transpose(0, 1, 3, 2, 4).reshape(m, 9, 9)) \
+        .reshape(m, 3, 3, 3, 3).transpose(0, 1, 3, 2, 4).reshape(m, 81)
+    cand &= (removed[:, :, None] & _BITS) == 0
+
+    # a puzzle has no solution if a cell has no candidate or has to take two digits,
+    # or if a digit has no cell left in a unit
+    bad = (cand.sum(axis=2, dtype=np.int8) == 0).any(axis=1) | (hidden_count > 1).any(axis=1)
+    bad |= (cand4.sum(axis=2, dtype=np.int8) == 0).any(axis=(1, 2))
+    bad |= (cand4.sum(axis=1, dtype=np.int8) == 0).any(axis=(1, 2))
+    bad |= (cand6.sum(axis=(2, 4), dtype=np.int8) == 0).any(axis=(1, 2, 3))
+    return bad
+
+
+def _twin_removals(code):
+    """
+    :param code:    (M, 9, 9) int16 array of candidate codes of the cells of 9 units, the
+                    codes of cells that do not have exactly two candidates must be 0
+    :return: (M, 9, 9) int16 array with the codes of the candidates the hidden twin rule
+             removes from each cell
+    """
+    twin = ((code[:, :, :, None] == code[:, :, None, :]) & ~np.eye(9, dtype=bool)).any(axis=3)
+    twin_code = np.where(twin & (code != 0), code, 0).astype(np.int16)
+    unit_code = np.bitwise_or.reduce(twin_code, axis=2)
+    return unit_code[:, :, None] & ~twin_code
@@ -0,0 +1,324 @@
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+
+from sudoku import Sudoku, IncorrectSudokuException, ENGINES, box_size_of_line, \
+    DEFAULT_STRATEGIES, STRATEGIES, SolveStats, DEFAULT_VARIABLE_ORDER, DEFAULT_VALUE_ORDER, \
+    VARIABLE_ORDERS, VALUE_ORDERS
+
+#: directory of the bundled puzzle files, one puzzle per line (see Sudoku.read_line):
+#:  easy            puzzles with many clues
+#:  propagation     minimal puzzles that Sudoku.solve() solves without guessing
+#:  seventeen       puzzles with 17 clues, the fewest a unique sudoku can have
+#:  hard            well known puzzles that need many guesses
+#:  sparse          nearly empty puzzles with many solutions
+#:  size9, size16,  9x9, 16x16 and 25x25 puzzles with half of the cells given,
+#:  size25          generated by sudoku_generator, to compare the larger sudokus
+PUZZLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzles")
+
+#: the measured solvers: "solve" is Sudoku.solve(), the propagation alone, which may
+#: leave a puzzle unsolved, the others are the engines of Sudoku.recursive_solve()
+METHODS = ("solve",) + ENGINES
+
+#: the fields of a result that are compared with the baseline, with True if a larger
+#: value is better
+_COMPARED = (("per_second", True), ("p99_ms", False), ("guesses", False),
+             ("peak_kib", False))
+
+
+def read_puzzles(path):
+    """
+    :return: list of the non-empty lines of a puzzle file
+    """
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def bundled_corpora():
+    """
+    :return: dict of corpus name -> path of the puzzle files in PUZZLE_DIR
+    """
+    return {name[:-4]: os.path.join(PUZZLE_DIR, name)
+            for name in sorted(os.listdir(PUZZLE_DIR)) if name.endswith(".txt")}
+
+
+def run_method(puzzles, method, trace_memory=False, strategies=DEFAULT_STRATEGIES,
+               observer=None, variable_order=DEFAULT_VARIABLE_ORDER,
+               value_order=DEFAULT_VALUE_ORDER):
+    """
+    solve every puzzle with the method, the time of reading a puzzle is not measured
+    :param puzzles:         list of puzzle lines of any size, see sudoku.box_size_of_line()
+    :param method:          name of the solver, see METHODS
+    :param trace_memory:    True to measure the memory with tracemalloc, which slows
+                            down the solver considerably
+    :param strategies:      Sudoku.strategies of the rules engine and of "solve"
+    :param observer:        Sudoku.observer of the rules engine and of "solve", which
+                            slows down the solver
+    :param variable_order:  Sudoku.variable_order of the rules engine
+    :param value_order:     Sudoku.value_order of the rules engine
+    :return: tuple (list of seconds per puzzle, list of guesses per puzzle, number of
+             solved puzzles, peak of memory allocated while solving a single puzzle in
+             bytes, 0 without trace_memory)
+    """
+    if method not in METHODS:
+        raise ValueError("unknown method %r, expected one of %s" % (method, METHODS))
+    times = []
+    guesses = []
+    solved = 0
+    peak = 0
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        for puzzle in puzzles:
+            sudoku = Sudoku(box_size=box_size_of_line(puzzle))
+            sudoku.read_line(puzzle)
+            sudoku.strategies = strategies
+            sudoku.observer = observer
+            sudoku.variable_order = variable_order
+            sudoku.value_order = value_order
+            if trace_memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                if method == "solve":
+                    sudoku.solve()
+                else:
+                    sudoku.recursive_solve(engine=method)
+            except IncorrectSudokuException:
+                pass
+            times.append(time.perf_counter() - start)
+            if trace_memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+            guesses.append(sudoku.guesses)
+            solved += sudoku.solved
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return times, guesses, solved, peak
+
+
+def percentile(values, q):
+    """
+    :param values:  non-empty list of numbers
+    :param q:       fraction between 0 and 1
+    :return: the smallest value that is at least as large as the fraction q of the values
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def benchmark(corpora, methods=METHODS, strategies=DEFAULT_STRATEGIES):
+    """
+    run every method on every corpus, once to measure the time and once more to measure
+    the memory
+    :param corpora:     dict of corpus name -> list of puzzles
+    :param strategies:  Sudoku.strategies of the rules engine and of "solve"
+    :return: list of dicts with the keys corpus, method, puzzles, solved, seconds,
+             per_second, p50_ms, p99_ms, max_ms, guesses (in total) and peak_kib
+    """
+    rows = []
+    for name, puzzles in corpora.items():
+        if not puzzles:
+            continue
+        for method in methods:
+            times, guesses, solved, _ = run_method(puzzles, method, strategies=strategies)
+            peak = run_method(puzzles, method, trace_memory=True, strategies=strategies)[3]
+            total = sum(times)
+            rows.append({"corpus": name, "method": method, "puzzles": len(puzzles),
+                         "solved": solved, "seconds": total,
+                         "per_second": len(puzzles) / total if total else float("inf"),
+                         "p50_ms": 1000 * percentile(times, 0.5),
+                         "p99_ms": 1000 * percentile(times, 0.99),
+                         "max_ms": 1000 * max(times), "guesses": sum(guesses),
+                         "peak_kib": peak / 1024})
+    return rows
+
+
+def measure_strategies(corpora, strategies=None):
+    """
+    measure what each strategy costs and saves when it is added to DEFAULT_STRATEGIES of
+    the rules engine
+    :param corpora:     dict of corpus name -> list of puzzles
+    :param strategies:  names of the measured strategies, defaults to the strategies of
+                        STRATEGIES that are not in DEFAULT_STRATEGIES
+    :return: list of dicts with the keys corpus, strategy, seconds (of the whole solver),
+             rule_seconds (spent in the strategy), calls, changes (calls that changed the
+             sudoku), guesses and guesses_saved (compared to DEFAULT_STRATEGIES), the
+             first row of each corpus is DEFAULT_STRATEGIES itself with the strategy
+             "default"
+    """
+    if strategies is None:
+        strategies = [name for name in STRATEGIES if name not in DEFAULT_STRATEGIES]
+    rows = []
+    for name, puzzles in corpora.items():
+        if not puzzles:
+            continue
+        base_guesses = None
+        for strategy in [None] + list(strategies):
+            chosen = DEFAULT_STRATEGIES if strategy is None else \
+                DEFAULT_STRATEGIES + (strategy,)
+            times, guesses, _, _ = run_method(puzzles, "rules", strategies=chosen)
+            stats = SolveStats()
+            run_method(puzzles, "rules", strategies=chosen, observer=stats)
+            if base_guesses is None:
+                base_guesses = sum(guesses)
+            rule = strategy or chosen[0]
+            rows.append({"corpus": name, "strategy": strategy or "default",
+                         "seconds": sum(times),
+                         "rule_seconds": stats.seconds.get(rule, 0.0),
+                         "calls": stats.calls.get(rule, 0),
+                         "changes": stats.changes.get(rule, 0),
+                         "guesses": sum(guesses),
+                         "guesses_saved": base_guesses - sum(guesses)})
+    return rows
+
+
+def measure_policies(corpora, variable_orders=None, value_orders=None):
+    """
+    measure the search tree of the rules engine with each combination of the branching
+    policies
+    :param corpora:         dict of corpus name -> list of puzzles
+    :param variable_orders: names of the measured variable orders, defaults to all of
+                            VARIABLE_ORDERS
+    :param value_orders:    names of the measured value orders, defaults to all of
+                            VALUE_ORDERS
+    :return: list of dicts with the keys corpus, variable_order, value_order, seconds,
+             nodes (guesses in total), max_nodes (of a single puzzle) and nodes_saved
+             (compared to the default policies), the first row of each corpus is the
+             default policies
+    """
+    combinations = [(DEFAULT_VARIABLE_ORDER, DEFAULT_VALUE_ORDER)]
+    for variable_order in variable_orders or VARIABLE_ORDERS:
+        for value_order in value_orders or VALUE_ORDERS:
+            if (variable_order, value_order) not in combinations:
+                combinations.append((variable_order, value_order))
+    rows = []
+    for name, puzzles in corpora.items():
+        if not puzzles:
+            continue
+        base_nodes = None
+        for variable_order, value_order in combinations:
+            times, guesses, _, _ = run_method(puzzles, "rules",
+                                              variable_order=variable_order,
+                                              value_order=value_order)
+            if base_nodes is None:
+                base_nodes = sum(guesses)
+            rows.append({"corpus": name, "variable_order": variable_order,
+                         "value_order": value_order, "seconds": sum(times),
+                         "nodes": sum(guesses), "max_nodes": max(guesses),
+                         "nodes_saved": base_nodes - sum(guesses)})
+    return rows
+
+
+def compare(rows, baseline, tolerance=0.1):
+    """
+    find the regressions of a benchmark() result against a baseline
+    :param rows:        result of benchmark()
+    :param baseline:    earlier result of benchmark(), rows without a matching corpus and
+                        method in the baseline are not compared
+    :param tolerance:   relative change of a field that is not reported as regression
+    :return: list of messages, one for every regression
+    """
+    reference = {(row["corpus"], row["method"]): row for row in baseline}
+    regressions = []
+    for row in rows:
+        base = reference.get((row["corpus"], row["method"]))
+        if base is None:
+            continue
+        prefix = "%s/%s: " % (row["corpus"], row["method"])
+        if row["solved"] != base["solved"]:
+            regressions.append(prefix + "solved %i puzzles instead of %i"
+                               % (row["solved"], base["solved"]))
+        for field, larger_is_better in _COMPARED:
+            if larger_is_better:
+                worse = row[field] < base[field] * (1 - tolerance)
+            else:
+                worse = row[field] > base[field] * (1 + tolerance)
+            if worse:
+                regressions.append(prefix + "%s changed from %.6g to %.6g"
+                                   % (field, base[field], row[field]))
+    return regressions
+
+
+def read_report(path):
+    """
+    :return: the result rows of a report written by write_report()
+    """
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def write_report(path, rows):
+    """
+    write the benchmark() result as json together with the python version
+    """
+    with open(path, "w") as f:
+        json.dump({"python": platform.python_version(), "results": rows}, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="benchmark the solvers on puzzle corpora")
+    parser.add_argument("files", nargs="*",
+                        help="puzzle files with one puzzle per line, default: the bundled "
+                             "corpora")
+    parser.add_argument("-m", "--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("-j", "--json", metavar="FILE", help="write the results as json")
+    parser.add_argument("-b", "--baseline", metavar="FILE",
+                        help="json results of an earlier run, regressions are reported and "
+                             "make the exit status 1")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1,
+                        help="allowed relative change against the baseline (default 0.1)")
+    parser.add_argument("-s", "--strategies", nargs="+", choices=list(STRATEGIES),
+                        default=list(DEFAULT_STRATEGIES),
+                        help="strategies of the rules engine in this order")
+    parser.add_argument("--measure-strategies", action="store_true",
+                        help="measure the cost and the saved guesses of each strategy that "
+                             "is not in the default strategies instead")
+    parser.add_argument("--measure-policies", action="store_true",
+                        help="measure the nodes of the search with each combination of the "
+                             "branching policies instead")
+    args = parser.parse_args()
+
+    paths = {os.path.splitext(os.path.basename(p))[0]: p for p in args.files} \
+        or bundled_corpora()
+    corpora = {name: read_puzzles(path) for name, path in paths.items()}
+    if args.measure_strategies:
+        print("%-12s %-18s %9s %9s %7s %7s %8s %6s" % (
+            "corpus", "strategy", "seconds", "rule s", "calls", "changes", "guesses", "saved"))
+        for row in measure_strategies(corpora):
+            print("%-12s %-18s %9.3f %9.3f %7i %7i %8i %6i" % (
+                row["corpus"], row["strategy"], row["seconds"], row["rule_seconds"],
+                row["calls"], row["changes"], row["guesses"], row["guesses_saved"]))
+        sys.exit(0)
+    if args.measure_policies:
+        print("%-12s %-12s %-12s %9s %8s %9s %8s" % (
+            "corpus", "variable", "value", "seconds", "nodes", "max nodes", "saved"))
+        for row in measure_policies(corpora):
+            print("%-12s %-12s %-12s %9.3f %8i %9i %8i" % (
+                row["corpus"], row["variable_order"], row["value_order"], row["seconds"],
+                row["nodes"], row["max_nodes"], row["nodes_saved"]))
+        sys.exit(0)
+    rows = benchmark(corpora, args.methods, tuple(args.strategies))
+    print("%-12s %-6s %7s %6s %9s %9s %8s %8s %8s %8s %8s" % (
+        "corpus", "method", "puzzles", "solved", "seconds", "puzzles/s", "p50 ms", "p99 ms",
+        "max ms", "guesses", "peak KiB"))
+    for row in rows:
+        print("%-12s %-6s %7i %6i %9.3f %9.1f %8.2f %8.2f %8.2f %8i %8.1f" % (
+            row["corpus"], row["method"], row["puzzles"], row["solved"], row["seconds"],
+            row["per_second"], row["p50_ms"], row["p99_ms"], row["max_ms"], row["guesses"],
+            row["peak_kib"]))
+    if args.json:
+        write_report(args.json, rows)
+    if args.baseline:
+        regressions = compare(rows, read_report(args.baseline), args.tolerance)
+        for message in regressions:
+            print("regression: " + message, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import islice
+
+import sudoku_io
+from sudoku import Sudoku, box_size_of_line
+
+#: result of a single puzzle of solve_many()
+#:  index       position of the puzzle in the input
+#:  puzzle      the puzzle as it was given
+#:  solution    the solved puzzle in the same format as the input, None on failure
+#:  error       the exception raised while reading or solving the puzzle, None on success
+SolveResult = namedtuple("SolveResult", ["index", "puzzle", "solution", "error"])
+
+
+def solve_many(puzzles, workers=None, chunksize=64, ordered=True, max_pending=None,
+               max_nodes=None, timeout=None):
+    """
+    Solve a stream of puzzles with Sudoku.recursive_solve() in a pool of worker processes.
+    The input is consumed lazily and only max_pending chunks are in flight at any time,
+    so neither the puzzles nor the results have to fit into memory at once.
+    A puzzle that can not be read or solved does not stop the batch, its exception is
+    reported in the error field of its result.
+    :param puzzles:     iterable of puzzle strings, either single lines of 81 digits
+                        (see Sudoku.read_line, larger sudokus are recognized by the length
+                        of the line) or 9x9 sudokus in the format of Sudoku.read_string
+    :param workers:     number of worker processes, defaults to the number of cpus.
+                        With 0 the puzzles are solved in the calling process.
+    :param chunksize:   number of puzzles that are sent to a worker at once
+    :param ordered:     True to yield the results in input order, False to yield them
+                        as soon as their chunk has been solved
+    :param max_pending: maximal number of chunks submitted to the pool but not yielded
+                        yet, defaults to 2 * workers
+    :param max_nodes:   largest number of guesses per puzzle, None for no limit
+    :param timeout:     seconds the search of a puzzle may take, None for no limit. A
+                        puzzle beyond its budget gets a SolveBudgetExceeded error.
+    :return: generator of SolveResult tuples
+    """
+    function = partial(_solve_chunk, max_nodes=max_nodes, timeout=timeout)
+    for start, chunk, outcomes in map_chunks(function, puzzles, workers, chunksize,
+                                             ordered, max_pending):
+        for index, (puzzle, (solution, error)) in enumerate(zip(chunk, outcomes), start):
+            yield SolveResult(index, puzzle, solution, error)
+
+
+def map_chunks(function, items, workers=None, chunksize=64, ordered=True, max_pending=None):
+    """
+    Apply function to chunks of items in a pool of worker processes. items is consumed
+    lazily and at most max_pending chunks are in flight at any time.
+    :param function:    picklable function that takes a list of items and returns a list of
+                        results
+    :param items:       iterable of picklable items
+    :param workers:     number of worker processes, defaults to the number of cpus.
+                        With 0 the chunks are processed in the calling process.
+    :param chunksize:   number of items that are sent to a worker at once
+    :param ordered:     True to yield the chunks in input order, False to yield them as
+                        soon as they are done
+    :param max_pending: maximal number of chunks submitted to the pool but not yielded
+                        yet, defaults to 2 * workers
+    :return: generator of (index of the first item, chunk, function(chunk)) tuples
+    """
+    chunks = _chunks(items, chunksize)
+    if workers == 0:
+        for start, chunk in chunks:
+            yield start, chunk, function(chunk)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    executor = ProcessPoolExecutor(workers)
+    try:
+        # pending[future] = (start, chunk), in submission order
+        pending = {}
+        for start, chunk in islice(chunks, max_pending):
+            pending[executor.submit(function, chunk)] = start, chunk
+        while pending:
+            if ordered:
+                done = [next(iter(pending))]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, chunk = pending.pop(future)
+                outcomes = future.result()
+                for start2, chunk2 in islice(chunks, 1):
+                    pending[executor.submit(function, chunk2)] = start2, chunk2
+                yield start, chunk, outcomes
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _chunks(items, chunksize):
+    """
+    split items into lists of chunksize items
+    :return: generator of (index of the first item, list of items) tuples
+    """
+    items = iter(items)
+    start = 0
+    while True:
+        chunk = list(islice(items, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _solve_chunk(chunk, max_nodes=None, timeout=None):
+    """
+    solve the puzzles of a chunk, runs inside the worker processes
+    :param max_nodes, timeout:  budget of each puzzle, see _solve_puzzle()
+    :return: list of (solution, error) tuples
+    """
+    outcomes = []
+    for puzzle in chunk:
+        try:
+            outcomes.append((_solve_puzzle(puzzle, max_nodes, timeout), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+def _solve_puzzle(puzzle, max_nodes=None, timeout=None):
+    """
+    :param max_nodes:   largest number of guesses, see Sudoku.recursive_solve()
+    :param timeout:     seconds the search may take, None for no limit
+    :return: the solution of the puzzle in the format of the puzzle
+    :raise SolveBudgetExceeded: if the puzzle needs more nodes or time
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    if "," in puzzle or ";" in puzzle:
+        sudoku = Sudoku()
+        sudoku.read_string(puzzle)
+        sudoku.recursive_solve(max_nodes=max_nodes, deadline=deadline)
+        return str(sudoku)
+    sudoku = Sudoku(box_size=box_size_of_line(puzzle))
+    sudoku.read_line(puzzle)
+    sudoku.recursive_solve(max_nodes=max_nodes, deadline=deadline)
+    return sudoku.to_line()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="solve a file with one puzzle per line")
+    parser.add_argument("file", help="file with one puzzle per line, '-' for stdin")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("-c", "--chunksize", type=int, default=64)
+    parser.add_argument("-u", "--unordered", action="store_true",
+                        help="write the solutions in completion order")
+    parser.add_argument("-p", "--packed", action="store_true",
+                        help="the file is in the packed format of sudoku_io")
+    parser.add_argument("-n", "--max-nodes", type=int, default=None,
+                        help="largest number of guesses per puzzle")
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+                        help="seconds the search of a puzzle may take")
+    args = parser.parse_args()
+
+    if args.packed:
+        lines = sudoku_io.read_packed(args.file)
+    elif args.file != "-":
+        lines = sudoku_io.read_lines(args.file)
+    else:
+        lines = (line.strip() for line in sys.stdin if line.strip())
+    for result in solve_many(lines, args.workers, args.chunksize, not args.unordered,
+                             max_nodes=args.max_nodes, timeout=args.timeout):
+        if result.error is None:
+            print(result.solution)
+        else:
+            print("%i: %s %s" % (result.index, type(result.error).__name__, result.error),
+                  file=sys.stderr)
+            print(result.puzzle)
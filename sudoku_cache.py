@@ -0,0 +1,226 @@
+"""
+Solution cache for 9x9 puzzles that recognizes isomorphic puzzles.
+
+Two puzzles are isomorphic if one is turned into the other by relabeling the digits,
+swapping rows within a band, columns within a stack, whole bands or stacks, and by
+transposition. All of them have the same canonical form, computed by canonical_form():
+among all 2 * 1296 * 1296 arrangements of the rows and columns it picks the smallest
+pattern of given cells, and among the arrangements with this pattern the smallest grid
+after relabeling the digits in the order of their first appearance.
+
+The pattern is found with array operations: for each of the 2 * 1296 row arrangements
+the best column arrangement is known directly, the columns of each stack are sorted by
+their pattern and the stacks by the pattern of their columns. Only the arrangements that
+tie for the smallest pattern, usually a handful, are relabeled one by one.
+"""
+from itertools import permutations, product
+
+import numpy as np
+
+from sudoku import IncorrectSudokuException, _LruTable
+
+#: _LINE_PERMUTATIONS[k] = order of the 9 rows (or columns) of the k-th of the 1296
+#: arrangements that keep the bands (stacks) together
+_LINE_PERMUTATIONS = np.array([[3 * band + i for band, lines in zip(bands, inner) for i in lines]
+                               for bands in permutations(range(3))
+                               for inner in product(permutations(range(3)), repeat=3)],
+                              dtype=np.intp)
+#: _LINE_WEIGHTS[k, line] = weight of the line in the pattern of a column (or row) after
+#: the k-th arrangement, the first line is the most significant one
+_LINE_WEIGHTS = np.zeros(_LINE_PERMUTATIONS.shape, dtype=np.int64)
+np.put_along_axis(_LINE_WEIGHTS, _LINE_PERMUTATIONS, 1 << np.arange(8, -1, -1), axis=1)
+#: _SPREAD[code] = the 9 bits of a column pattern 3 bits apart, to interleave the three
+#: columns of a stack into a pattern that is read row by row
+_SPREAD = np.array([sum(((code >> i) & 1) << 3 * i for i in range(9)) for code in range(512)],
+                   dtype=np.int64)
+#: _ROW_SHIFTS[r] = position of the 3 bits of row r in a stack pattern
+_ROW_SHIFTS = 3 * np.arange(8, -1, -1, dtype=np.int64)
+
+#: canonical_form() gives up on puzzles with more arrangements that tie for the smallest
+#: pattern, like the nearly empty ones
+MAX_TIES = 2048
+#: the value of the lookups of SolutionCache that find no entry, None is a cached puzzle
+#: without solution
+_UNKNOWN = object()
+
+
+def canonical_form(grid):
+    """
+    :param grid:    9x9 list of lists, grid[x][y] is the digit in cell (x, y), zero
+                    symbolizes no value (see Sudoku.grid)
+    :return: tuple (key, transform) or None if the puzzle has more than MAX_TIES
+             arrangements with the smallest pattern. key is a bytes object with the 81
+             relabeled digits of the canonical form row by row, transform describes how
+             the grid is turned into it, see transform_grid().
+    """
+    values = np.array(grid, dtype=np.int8).T          # values[row, column]
+    oriented = (values, values.T)
+
+    # column_codes[t, k, column] is the pattern of given cells in a column as 9 bit
+    # number for transposition t and row arrangement k
+    given = np.stack([v != 0 for v in oriented]).astype(np.int64)
+    column_codes = _LINE_WEIGHTS @ given
+    # the smallest pattern sorts the columns of a stack and the stacks, stack_codes[t, k, s]
+    # is the pattern of stack s with sorted columns read row by row
+    stacks = np.sort(column_codes.reshape(2, -1, 3, 3), axis=3)
+    stack_codes = (_SPREAD[stacks] << np.array([2, 1, 0])).sum(axis=3)
+    # the whole pattern row by row, split into the first 4 and the last 5 rows to fit
+    # into 64 bits
+    rows = (np.sort(stack_codes, axis=2)[..., None] >> _ROW_SHIFTS) & 7
+    rows = (rows << np.array([6, 3, 0])[:, None]).sum(axis=2).reshape(-1, 9)
+    high = (rows[:, :4] << np.array([27, 18, 9, 0])).sum(axis=1)
+    low = (rows[:, 4:] << np.array([36, 27, 18, 9, 0])).sum(axis=1)
+    best = high == high.min()
+    best &= low == low[best].min()
+    ties = np.flatnonzero(best)
+
+    candidates = []
+    count = 0
+    for tie in ties:
+        t, k = divmod(int(tie), len(_LINE_PERMUTATIONS))
+        orders = _column_orders(column_codes[t, k].tolist(), stack_codes[t, k].tolist())
+        count += len(orders)
+        if count > MAX_TIES:
+            return None
+        candidates.append((t, _LINE_PERMUTATIONS[k], orders))
+
+    best_key = None
+    best_transform = None
+    for t, rows, orders in candidates:
+        rearranged = oriented[t][rows]
+        for columns in orders:
+            cells = rearranged[:, columns].ravel().tolist()
+            labels = {}
+            key = bytes([labels.setdefault(n, len(labels) + 1) if n else 0 for n in cells])
+            if best_key is None or key < best_key:
+                best_key = key
+                best_transform = (t, tuple(rows.tolist()), columns, labels)
+    t, rows, columns, labels = best_transform
+    # digits that are not given get the remaining labels in ascending order
+    for n in range(1, 10):
+        labels.setdefault(n, len(labels) + 1)
+    return best_key, (t, rows, columns, labels)
+
+
+def _column_orders(codes, stack_codes):
+    """
+    :param codes:       patterns of the 9 columns as 9 bit numbers
+    :param stack_codes: patterns of the 3 stacks with sorted columns, read row by row
+    :return: list of all column orders that keep the stacks together and give the
+             smallest pattern: the columns of a stack are sorted by their code and the
+             stacks by the codes of their sorted columns, equal columns and equal stacks
+             can be exchanged
+    """
+    stacks = []
+    for s in range(3):
+        columns = sorted(range(3 * s, 3 * s + 3), key=lambda c: codes[c])
+        stacks.append((stack_codes[s], columns))
+    stacks.sort()
+    # every group of equal stacks can be permuted, and inside a stack every group of
+    # equal columns
+    stack_choices = []
+    start = 0
+    while start < 3:
+        end = start
+        while end < 3 and stacks[end][0] == stacks[start][0]:
+            end += 1
+        stack_choices.append(list(permutations(range(start, end))))
+        start = end
+    column_choices = [_equal_permutations(columns, [codes[c] for c in columns])
+                      for _, columns in stacks]
+    orders = []
+    for stack_order in product(*stack_choices):
+        order = [s for group in stack_order for s in group]
+        for inner in product(*(column_choices[s] for s in order)):
+            orders.append([c for columns in inner for c in columns])
+    return orders
+
+
+def _equal_permutations(items, codes):
+    """
+    :return: list of the orders of the sorted items that only exchange items with equal
+             codes
+    """
+    groups = []
+    start = 0
+    while start < len(items):
+        end = start
+        while end < len(items) and codes[end] == codes[start]:
+            end += 1
+        groups.append(list(permutations(items[start:end])))
+        start = end
+    return [[item for group in choice for item in group] for choice in product(*groups)]
+
+
+def transform_grid(grid, transform):
+    """
+    :param grid:        9x9 list of lists in the orientation of Sudoku.grid
+    :param transform:   transform of canonical_form()
+    :return: the transformed and relabeled grid as 9x9 list of lists grid[x][y]
+    """
+    t, rows, columns, labels = transform
+    values = [[grid[x][y] for x in range(9)] for y in range(9)]   # values[row][column]
+    if t:
+        values = [list(line) for line in zip(*values)]
+    return [[labels[values[rows[y]][columns[x]]] if values[rows[y]][columns[x]] else 0
+             for y in range(9)] for x in range(9)]
+
+
+def untransform_grid(grid, transform):
+    """
+    inverse of transform_grid()
+    """
+    t, rows, columns, labels = transform
+    digits = {label: n for n, label in labels.items()}
+    values = [[0] * 9 for _ in range(9)]
+    for x in range(9):
+        for y in range(9):
+            label = grid[x][y]
+            values[rows[y]][columns[x]] = digits[label] if label else 0
+    if t:
+        values = [list(line) for line in zip(*values)]
+    return [[values[y][x] for y in range(9)] for x in range(9)]
+
+
+class SolutionCache(_LruTable):
+    """
+    LRU cache of solutions keyed by the canonical form of the puzzles, see
+    canonical_form(). A puzzle that is isomorphic to a cached one gets the cached solution
+    mapped back to its own orientation and labels without any search. Puzzles without
+    solution are cached as well.
+    The least recently used puzzles are evicted, see sudoku._LruTable for the attributes,
+    hits and misses count the puzzles answered from the cache and solved. The entries map
+    canonical keys to canonical solutions, or None for puzzles without solution.
+    """
+    def __init__(self, maxsize=1024):
+        super().__init__(maxsize)
+
+    def solve(self, sudoku, engine="rules"):
+        """
+        Solve the sudoku like Sudoku.recursive_solve(), but take the solution from the
+        cache if an isomorphic puzzle has been solved before. Sudokus that are not 9x9
+        and puzzles that canonical_form() gives up on are solved without the cache and
+        counted as misses.
+        :param engine:  engine of recursive_solve() for the misses
+        :raise IncorrectSudokuException: If the input sudoku has no solution.
+        """
+        form = canonical_form(sudoku.grid) if sudoku.box_size == 3 else None
+        if form is None:
+            self.misses += 1
+            sudoku.recursive_solve(engine)
+            return
+        key, transform = form
+        solution = self._lookup(key, _UNKNOWN)
+        if solution is not _UNKNOWN:
+            if solution is None:
+                raise IncorrectSudokuException()
+            sudoku.grid = untransform_grid(solution, transform)
+            sudoku.solved = True
+            sudoku.guesses = 0
+            return
+        try:
+            sudoku.recursive_solve(engine)
+        except IncorrectSudokuException:
+            self._store(key, None)
+            raise
+        self._store(key, transform_grid(sudoku.grid, transform))
@@ -0,0 +1,242 @@
+"""
+Algorithm X with Dancing Links (see https://arxiv.org/abs/cs/0011047) for sudokus.
+
+A 9x9 sudoku is an exact cover problem with 324 constraints (columns of the matrix), each
+of them has to be satisfied by exactly one placed digit:
+    81 cells            cell (x, y) contains a digit
+    81 row digits       row y contains the digit n
+    81 column digits    column x contains the digit n
+    81 box digits       box b contains the digit n
+Every candidate "digit n in cell (x, y)" is a row of the matrix that satisfies 4 of the
+constraints. A sudoku with size digits has 4 * size ** 2 constraints in the same order.
+
+The matrix is stored as a toroidal doubly linked list in flat integer lists: node i has
+the neighbours L[i], R[i], U[i], D[i] and belongs to the column C[i]. The nodes
+0..324 (of a 9x9 sudoku) are the root (0) and the column headers, ROW[i] is the candidate
+(x, y, n) of the node. The lists of the empty sudoku of each size are built once by
+_matrix().
+"""
+
+
+def _build_matrix(box_size):
+    """
+    :return: the lists (L, R, U, D, C, ROW) of the empty sudoku with boxes of
+             box_size x box_size cells
+    """
+    size = box_size * box_size
+    cells = size * size
+    columns = 4 * cells
+    L = [i - 1 for i in range(columns + 1)]
+    R = [i + 1 for i in range(columns + 1)]
+    L[0] = columns
+    R[columns] = 0
+    U = list(range(columns + 1))
+    D = list(range(columns + 1))
+    C = list(range(columns + 1))
+    ROW = [None] * (columns + 1)
+    for x in range(size):
+        for y in range(size):
+            for n in range(1, size + 1):
+                box = (x // box_size) * box_size + y // box_size
+                first = len(C)
+                for k, c in enumerate((1 + size * x + y,
+                                       1 + cells + size * y + n - 1,
+                                       1 + 2 * cells + size * x + n - 1,
+                                       1 + 3 * cells + size * box + n - 1)):
+                    i = first + k
+                    L.append(first + (k - 1) % 4)
+                    R.append(first + (k + 1) % 4)
+                    # append at the bottom of the column
+                    U.append(U[c])
+                    D.append(c)
+                    D[U[c]] = i
+                    U[c] = i
+                    C.append(c)
+                    ROW.append((x, y, n))
+    return L, R, U, D, C, ROW
+
+
+#: _MATRICES[box_size] = (L, R, U, D, C, ROW, FIRST) of the empty sudoku, where
+#: FIRST[x][y][n - 1] is the first node of the row of the candidate (x, y, n)
+_MATRICES = {}
+
+
+def _matrix(box_size):
+    """
+    :return: the shared lists (L, R, U, D, C, ROW, FIRST) of the box size, which must not be
+             changed
+    """
+    matrix = _MATRICES.get(box_size)
+    if matrix is None:
+        size = box_size * box_size
+        first = 4 * size * size + 1
+        FIRST = [[[first + 4 * (size * size * x + size * y + n) for n in range(size)]
+                  for y in range(size)] for x in range(size)]
+        matrix = _MATRICES[box_size] = _build_matrix(box_size) + (FIRST,)
+    return matrix
+
+
+class DancingLinks:
+    """
+    Exact cover search on the sudoku matrix. Every instance works on its own copy of the
+    link lists, C, ROW and FIRST of _matrix() are shared.
+
+    Attributes:
+        _size       _size[c] = number of nodes in the column c
+        _given      list of the first nodes of the rows selected for the given digits
+        consistent  False if the given digits already violate a constraint
+        guesses     number of rows selected by solutions() from columns with more than
+                    one row, including the wrong selections
+    """
+    def __init__(self, grid, exclude=()):
+        """
+        :param grid:    9x9 (size x size, where size is a square) list of lists,
+                        grid[x][y] is the digit in cell (x, y), zero symbolizes no value
+                        (see Sudoku.grid)
+        :param exclude: iterable of (x, y, n) candidates of empty cells that are removed
+                        from the matrix
+        """
+        size = len(grid)
+        box_size = round(size ** 0.5)
+        L, R, U, D, self._c, self._row, FIRST = _matrix(box_size)
+        self._l, self._r = L[:], R[:]
+        self._u, self._d = U[:], D[:]
+        self._size = [size] * (4 * size * size + 1)
+        self._max_size = size
+        self._given = []
+        self.consistent = True
+        self.guesses = 0
+        U, D, C = self._u, self._d, self._c
+        for x, y, n in set(exclude):
+            if grid[x][y] != 0:
+                continue
+            first = FIRST[x][y][n - 1]
+            for j in range(first, first + 4):
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                self._size[C[j]] -= 1
+        covered = set()
+        for x in range(size):
+            for y in range(size):
+                n = grid[x][y]
+                if n == 0:
+                    continue
+                first = FIRST[x][y][n - 1]
+                for i in range(first, first + 4):
+                    if C[i] in covered:
+                        self.consistent = False
+                        return
+                    covered.add(C[i])
+                    self._cover(C[i])
+                self._given.append(first)
+
+    def _cover(self, c):
+        """
+        remove the column c from the header list and all rows of c from the other columns
+        """
+        L, R, U, D, C, size = self._l, self._r, self._u, self._d, self._c, self._size
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                size[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def _uncover(self, c):
+        """
+        undo _cover(c)
+        """
+        L, R, U, D, C, size = self._l, self._r, self._u, self._d, self._c, self._size
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                size[C[j]] += 1
+                D[U[j]] = j
+                U[D[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[c]] = c
+        L[R[c]] = c
+
+    def _choose_column(self):
+        """
+        :return: the uncovered column with the fewest rows, 0 if all columns are covered
+        """
+        R, size = self._r, self._size
+        best, best_size = 0, self._max_size + 1
+        c = R[0]
+        while c != 0:
+            if size[c] < best_size:
+                best, best_size = c, size[c]
+                if best_size <= 1:
+                    break
+            c = R[c]
+        return best
+
+    def solutions(self, budget=None):
+        """
+        Search for the exact covers with an explicit stack of the selected rows.
+        :param budget:  None or an object whose check(nodes, depth) method is called
+                        before every guess with the number of guesses including this one
+                        and its depth, it stops the search by raising an exception
+        :return: generator of solutions, each one a list of the (x, y, n) candidates that
+                 are placed in addition to the given digits
+        """
+        if not self.consistent:
+            return
+        R, L, D, C, ROW = self._r, self._l, self._d, self._c, self._row
+        # selected[k] = node of the row selected at depth k
+        selected = []
+        while True:
+            c = self._choose_column()
+            if c == 0:
+                yield [ROW[i] for i in selected]
+                i = c
+            else:
+                self._cover(c)
+                i = D[c]
+            # move to the next row of the current column, backtracking while a column
+            # has no row left to try
+            while i == C[i]:
+                if c != 0:
+                    self._uncover(c)
+                if not selected:
+                    return
+                i = selected.pop()
+                j = L[i]
+                while j != i:
+                    self._uncover(C[j])
+                    j = L[j]
+                c = C[i]
+                i = D[i]
+            selected.append(i)
+            # covering a column does not change its own size, so this is the number of
+            # rows the column had when it was chosen
+            if self._size[c] > 1:
+                if budget is not None:
+                    budget.check(self.guesses + 1, len(selected))
+                self.guesses += 1
+            j = R[i]
+            while j != i:
+                self._cover(C[j])
+                j = R[j]
+
+
+def solve(grid):
+    """
+    :param grid:    list of lists, grid[x][y] is the digit in cell (x, y),
+                    zero symbolizes no value (see Sudoku.grid)
+    :return: a solved copy of grid, None if there is no solution
+    """
+    for placed in DancingLinks(grid).solutions():
+        solution = [column[:] for column in grid]
+        for x, y, n in placed:
+            solution[x][y] = n
+        return solution
+    return None
@@ -0,0 +1,216 @@
+import random
+from functools import partial
+
+from sudoku import Sudoku, IncorrectSudokuException, digit_bit
+from sudoku_bulk import map_chunks
+
+#: SYMMETRIES[name](x, y, last) = cells that are removed together with the cell (x, y),
+#: last is the largest coordinate, 8 for 9x9 sudokus
+SYMMETRIES = {
+    "none": lambda x, y, last: {(x, y)},
+    "rotational": lambda x, y, last: {(x, y), (last - x, last - y)},
+    "mirror": lambda x, y, last: {(x, y), (last - x, y)},
+    "diagonal": lambda x, y, last: {(x, y), (y, x)},
+    "dihedral": lambda x, y, last: {(x, y), (last - x, y), (x, last - y),
+                                    (last - x, last - y)},
+}
+
+
+def random_grid(rng=random, box_size=3):
+    """
+    Create a random completely filled sudoku. The boxes on the diagonal do not
+    constrain each other, so they are filled with random permutations and the rest of the
+    grid is found by Sudoku.recursive_solve().
+    :param rng:         random.Random instance or the random module
+    :param box_size:    box size of the sudoku, see Sudoku
+    :return: the solved Sudoku
+    """
+    sudoku = Sudoku(box_size=box_size)
+    size = sudoku.size
+    for box in range(box_size):
+        digits = rng.sample(range(1, size + 1), size)
+        for k, n in enumerate(digits):
+            sudoku.grid[box_size * box + k // box_size][box_size * box + k % box_size] = n
+    sudoku.recursive_solve()
+    return sudoku
+
+
+def generate(clues=None, symmetry="none", rng=random, engine="rules", box_size=3):
+    """
+    Generate a random puzzle with a unique solution. Starting from random_grid(), clues
+    are removed in random order as long as the puzzle stays unique.
+    Whether removing the digit n in cell (x, y) keeps the puzzle unique is checked by
+    searching for a solution without the digit n in the cell. With the rules engine, the
+    checks share one propagated state, see _propagated_removals(), most of them are decided
+    by the propagation alone, before any guess is made.
+    :param clues:       stop as soon as the puzzle has at most this many clues,
+                        None to remove as many clues as possible. The result may have
+                        more clues if no further clue can be removed.
+    :param symmetry:    name of the pattern in SYMMETRIES the clues should follow
+    :param rng:         random.Random instance or the random module
+    :param engine:      engine of the uniqueness checks, see Sudoku.recursive_solve()
+    :param box_size:    box size of the sudoku, see Sudoku
+    :return: tuple (puzzle, solution) of lines with 81 (size ** 2) digits
+    """
+    cells_of = SYMMETRIES[symmetry]
+    solution = random_grid(rng, box_size)
+    puzzle = Sudoku(solution)
+    size = puzzle.size
+    remaining = size * size
+    cells = [(x, y) for x in range(size) for y in range(size)]
+    rng.shuffle(cells)
+    # the cells that are removed together, in the order of their first cell
+    groups = []
+    grouped = set()
+    for cell in cells:
+        if cell not in grouped:
+            group = cells_of(*cell, size - 1)
+            grouped.update(group)
+            groups.append(list(group))
+    if engine == "rules":
+        removals = _propagated_removals(solution, groups)
+    else:
+        removals = _searched_removals(solution, groups, engine)
+    for group, removable in removals:
+        if clues is not None and remaining <= clues:
+            break
+        if removable:
+            for x, y in group:
+                puzzle.grid[x][y] = 0
+            remaining -= len(group)
+    return puzzle.to_line(), solution.to_line()
+
+
+def _propagated_removals(solution, groups):
+    """
+    Check the removals of generate() on one propagated state of the rules engine instead
+    of a new solver per check. The puzzle of the check of a group holds the clues of the
+    later groups and the kept clues of the earlier groups. The groups are split in halves:
+    the clues of the second half are placed, the first half is checked, the placed clues
+    are taken back on the _trail of the state, the kept clues of the first half are placed
+    and the second half is checked, each half split again in the same way. So the checks
+    only propagate the clues that changed, each group is placed about log2(groups) times.
+    :param solution:    the solved Sudoku
+    :param groups:      lists of the cells removed together, in the order of the removals
+    :return: generator of (group, removable) tuples, the removable groups are removed from
+             the puzzles of the following checks
+    """
+    sudoku = Sudoku(box_size=solution.box_size)
+    sudoku._init_poss()
+    sudoku._trail = []
+    kept = [False] * len(groups)
+    return _split_removals(sudoku, solution, groups, kept, 0, len(groups))
+
+
+def _split_removals(sudoku, solution, groups, kept, start, end):
+    """
+    check the removals of groups[start:end], see _propagated_removals()
+    :param kept:    kept[i] = True if the group i has been checked and is kept
+    """
+    if end - start == 1:
+        group = groups[start]
+        removable = not any(_other_solution(sudoku, x, y, solution.grid[x][y])
+                            for x, y in group)
+        kept[start] = not removable
+        yield group, removable
+        return
+    middle = (start + end) // 2
+    mark = len(sudoku._trail), sudoku._free_cells
+    _place_clues(sudoku, solution, groups[middle:end])
+    yield from _split_removals(sudoku, solution, groups, kept, start, middle)
+    sudoku._undo(*mark, None)
+    _place_clues(sudoku, solution, [group for group, keep
+                                    in zip(groups[start:middle], kept[start:middle]) if keep])
+    yield from _split_removals(sudoku, solution, groups, kept, middle, end)
+    sudoku._undo(*mark, None)
+
+
+def _other_solution(sudoku, x, y, n):
+    """
+    :return: whether the propagated sudoku has a solution without the digit n in the cell
+             (x, y), the search is taken back on the _trail of the sudoku
+    """
+    if sudoku.grid[x][y] != 0:
+        return False
+    mark = len(sudoku._trail), sudoku._free_cells
+    try:
+        sudoku._remove_poss(x, y, digit_bit(n))
+        search = sudoku._solutions()
+        found = next(search, None) is not None
+        search.close()
+    except IncorrectSudokuException:
+        found = False
+    sudoku._undo(*mark, None)
+    return found
+
+
+def _place_clues(sudoku, solution, groups):
+    """
+    place the digits of the solution in the cells of the groups and propagate, the digits
+    that are already filled in by the propagation are skipped
+    """
+    for group in groups:
+        for x, y in group:
+            if sudoku.grid[x][y] == 0:
+                sudoku.place(x, y, solution.grid[x][y])
+    sudoku._propagate()
+
+
+def _searched_removals(solution, groups, engine):
+    """
+    Check the removals of generate() with Sudoku.count_solutions() of the puzzle, for the
+    engines without propagation
+    :return: generator of (group, removable) tuples, see _propagated_removals()
+    """
+    puzzle = Sudoku(solution)
+    for group in groups:
+        for x, y in group:
+            puzzle.grid[x][y] = 0
+        removable = not any(puzzle.count_solutions(1, engine, [(x, y, solution.grid[x][y])])
+                            for x, y in group)
+        if not removable:
+            for x, y in group:
+                puzzle.grid[x][y] = solution.grid[x][y]
+        yield group, removable
+
+
+def generate_many(count, workers=None, seed=None, chunksize=8, **kwargs):
+    """
+    Generate puzzles with generate() in a pool of worker processes.
+    :param count:       number of puzzles
+    :param workers:     number of worker processes, see sudoku_bulk.map_chunks()
+    :param seed:        seed for reproducible puzzles, the i-th puzzle is created with
+                        random.Random("seed/i"). None for random puzzles.
+    :param chunksize:   number of puzzles that are generated by a worker at once
+    :param kwargs:      arguments of generate()
+    :return: generator of (puzzle, solution) tuples
+    """
+    seeds = (None if seed is None else "%s/%i" % (seed, i) for i in range(count))
+    for _, _, generated in map_chunks(partial(_generate_chunk, **kwargs), seeds, workers,
+                                      chunksize):
+        yield from generated
+
+
+def _generate_chunk(seeds, **kwargs):
+    """
+    :return: list with a generate() result for every seed
+    """
+    return [generate(rng=random.Random(seed), **kwargs) for seed in seeds]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="generate puzzles with a unique solution")
+    parser.add_argument("count", type=int)
+    parser.add_argument("-c", "--clues", type=int, default=None)
+    parser.add_argument("-s", "--symmetry", choices=sorted(SYMMETRIES), default="none")
+    parser.add_argument("-b", "--box-size", type=int, default=3,
+                        help="3 for 9x9 sudokus, 4 for 16x16, 5 for 25x25")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--seed", default=None)
+    args = parser.parse_args()
+
+    for puzzle, _ in generate_many(args.count, args.workers, args.seed, clues=args.clues,
+                                   symmetry=args.symmetry, box_size=args.box_size):
+        print(puzzle)
@@ -0,0 +1,106 @@
+"""
+Compact storage of many 9x9 puzzles.
+
+The packed format stores every cell in 4 bits, two cells per byte with the first cell in
+the high nibble, so a puzzle takes PACKED_SIZE = 41 bytes and the last nibble is 0.
+A packed file is a plain sequence of packed puzzles. Written as hex the nibbles are
+exactly the digits of the line format (see Sudoku.read_line), which makes packing and
+unpacking a bytes.fromhex() and bytes.hex() call.
+"""
+import mmap
+import os
+
+#: number of bytes of a packed 9x9 puzzle
+PACKED_SIZE = 41
+
+
+def pack_line(line):
+    """
+    :param line:    a 9x9 puzzle in the line format of Sudoku.read_line
+    :return: the puzzle packed into PACKED_SIZE bytes
+    :raise ValueError: if the line is not a 9x9 puzzle
+    """
+    digits = line.strip().replace(".", "0")
+    if len(digits) != 81 or not digits.isdigit() or not digits.isascii():
+        raise ValueError("expected a line with 81 digits, got %r" % line)
+    return bytes.fromhex(digits + "0")
+
+
+def unpack_line(data):
+    """
+    :param data:    a puzzle packed by pack_line()
+    :return: the line of the puzzle with 81 digits, zero symbolizes no value
+    """
+    return data.hex()[:81]
+
+
+def write_packed(path, lines):
+    """
+    write puzzles to a packed file
+    :param lines:   iterable of 9x9 puzzles in the line format
+    :return: the number of puzzles written
+    """
+    count = 0
+    with open(path, "wb") as f:
+        for line in lines:
+            f.write(pack_line(line))
+            count += 1
+    return count
+
+
+def read_packed(path):
+    """
+    Read a packed file through a memory map, so the file is never loaded as a whole.
+    :return: generator of the puzzle lines
+    :raise ValueError: if the size of the file is not a multiple of PACKED_SIZE
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size % PACKED_SIZE != 0:
+            raise ValueError("%s is no packed puzzle file, its size %i is no multiple of %i"
+                             % (path, size, PACKED_SIZE))
+        if size == 0:
+            # empty files can not be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset in range(0, size, PACKED_SIZE):
+                yield data[offset:offset + PACKED_SIZE].hex()[:81]
+
+
+def read_lines(path):
+    """
+    Read a file with one puzzle per line through a memory map.
+    :return: generator of the non-empty lines without white space, bytes that are no
+             ascii are replaced by U+FFFD, so Sudoku.read_line() rejects only their line
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for line in iter(data.readline, b""):
+                line = line.strip()
+                if line:
+                    yield line.decode("ascii", "replace")
+
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+    import sys
+
+    parser = argparse.ArgumentParser(description="convert between puzzle lines and the "
+                                                 "packed format")
+    parser.add_argument("source", help="file with one puzzle per line, or a packed file "
+                                       "with --unpack")
+    parser.add_argument("target", help="packed file, or '-' for stdout with --unpack")
+    parser.add_argument("-u", "--unpack", action="store_true",
+                        help="convert a packed file to lines")
+    args = parser.parse_args()
+
+    if args.unpack:
+        with open(args.target, "w") if args.target != "-" else \
+                contextlib.nullcontext(sys.stdout) as out:
+            for line in read_packed(args.source):
+                out.write(line + "\n")
+    else:
+        write_packed(args.target, read_lines(args.source))
@@ -0,0 +1,107 @@
+"""
+Load test client of sudoku_server.
+
+Every connection keeps up to pipeline puzzles in flight and measures the latency of each
+puzzle from sending its line to receiving the answer.
+"""
+import asyncio
+import time
+from itertools import cycle, islice
+
+from sudoku_benchmark import percentile
+
+
+async def _connection(host, port, puzzles, pipeline, latencies, errors):
+    """
+    send the puzzles over one connection and collect the latencies and errors
+    :param puzzles:     list of puzzle lines
+    :param latencies:   list the latencies in seconds are appended to
+    :param errors:      dict of error name -> count that is updated
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    window = asyncio.Semaphore(pipeline)
+    # sent[i] = time the i-th answered puzzle has been sent
+    sent = []
+
+    async def send():
+        for puzzle in puzzles:
+            await window.acquire()
+            sent.append(time.perf_counter())
+            writer.write(puzzle.encode("ascii") + b"\n")
+            await writer.drain()
+
+    sender = asyncio.get_running_loop().create_task(send())
+    try:
+        for index in range(len(puzzles)):
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("the server closed the connection after %i answers"
+                                      % index)
+            latencies.append(time.perf_counter() - sent[index])
+            window.release()
+            if line.startswith(b"ERROR"):
+                name = line[6:].split(b":")[0].strip().decode("ascii", "replace")
+                errors[name] = errors.get(name, 0) + 1
+        await sender
+    finally:
+        sender.cancel()
+        writer.close()
+
+
+async def load_test(puzzles, host="127.0.0.1", port=8765, requests=1000, connections=8,
+                    pipeline=4):
+    """
+    send requests puzzles to a running server, the puzzles are repeated as needed
+    :param puzzles:     non-empty list of puzzle lines
+    :param connections: number of concurrent connections
+    :param pipeline:    number of unanswered puzzles per connection
+    :return: dict with the keys requests, errors (dict of error name -> count), seconds,
+             per_second, p50_ms, p99_ms, p999_ms and max_ms
+    """
+    stream = cycle(puzzles)
+    shares = [list(islice(stream, requests // connections + (i < requests % connections)))
+              for i in range(connections)]
+    latencies = []
+    errors = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(_connection(host, port, share, pipeline, latencies, errors)
+                           for share in shares if share))
+    seconds = time.perf_counter() - start
+    return {"requests": len(latencies), "errors": errors, "seconds": seconds,
+            "per_second": len(latencies) / seconds if seconds else float("inf"),
+            "p50_ms": 1000 * percentile(latencies, 0.5),
+            "p99_ms": 1000 * percentile(latencies, 0.99),
+            "p999_ms": 1000 * percentile(latencies, 0.999),
+            "max_ms": 1000 * max(latencies)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sudoku_benchmark import bundled_corpora, read_puzzles
+
+    parser = argparse.ArgumentParser(description="measure throughput and latency of a "
+                                                 "running sudoku_server")
+    parser.add_argument("files", nargs="*",
+                        help="puzzle files with one puzzle per line, default: the bundled "
+                             "9x9 corpora")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--connections", type=int, default=8)
+    parser.add_argument("-l", "--pipeline", type=int, default=4,
+                        help="unanswered puzzles per connection (default 4)")
+    args = parser.parse_args()
+
+    corpora = bundled_corpora()
+    paths = args.files or [corpora[name] for name in ("easy", "propagation", "seventeen",
+                                                        "hard", "size9")]
+    puzzles = [puzzle for path in paths for puzzle in read_puzzles(path)]
+    result = asyncio.run(load_test(puzzles, args.host, args.port, args.requests,
+                                   args.connections, args.pipeline))
+    print("%i requests in %.3f s, %.1f requests/s" % (result["requests"], result["seconds"],
+                                                      result["per_second"]))
+    print("latency ms: p50 %.2f  p99 %.2f  p99.9 %.2f  max %.2f" % (
+        result["p50_ms"], result["p99_ms"], result["p999_ms"], result["max_ms"]))
+    for name, count in sorted(result["errors"].items()):
+        print("%s: %i" % (name, count))
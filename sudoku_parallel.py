@@ -0,0 +1,185 @@
+"""
+Parallel search of a single puzzle.
+
+split() expands the top levels of the search tree of Sudoku.recursive_solve() breadth
+first until there are enough open branches. Every branch is a puzzle of its own, the
+puzzle with the guessed digits and everything the propagation found, and the branches
+split the solutions of the puzzle between them. parallel_solve() searches the branches in
+a pool of worker processes and stops all of them as soon as one has found a solution,
+parallel_count() adds up the solutions of the branches.
+
+The workers are stopped through a multiprocessing.Event that every search checks before
+each guess, see CancelToken. Starting the pool costs some ten milliseconds, so this only
+pays off for puzzles that take much longer than that.
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from sudoku import Sudoku, IncorrectSudokuException, SolveBudgetExceeded, CancelToken, \
+    box_size_of_line
+
+#: CancelToken of the worker processes, set up by _init_worker()
+_cancel = None
+
+
+def split(sudoku, branches):
+    """
+    expand the search tree breadth first, guessing like recursive_solve() with the
+    branching policies of the sudoku, until there are at least branches open branches
+    :param sudoku:      the puzzle, it is not changed
+    :param branches:    number of open branches to stop at
+    :return: tuple (list of the lines of the open branches, list of the lines of the
+             solutions found while expanding)
+    """
+    root = Sudoku(sudoku)
+    try:
+        root.solve()
+    except IncorrectSudokuException:
+        return [], []
+    open_branches = deque([root])
+    solutions = []
+    while open_branches and len(open_branches) < branches:
+        node = open_branches.popleft()
+        if node.solved:
+            solutions.append(node.to_line())
+            continue
+        x, y, digits = node._branch()
+        for n in digits:
+            child = Sudoku(node)
+            try:
+                child.place(x, y, n)
+                child._propagate()
+            except IncorrectSudokuException:
+                continue
+            open_branches.append(child)
+    lines = []
+    for node in open_branches:
+        if node.solved:
+            solutions.append(node.to_line())
+        else:
+            lines.append(node.to_line())
+    return lines, solutions
+
+
+def _init_worker(event):
+    """
+    set up the CancelToken of a worker process
+    """
+    global _cancel
+    _cancel = CancelToken(event)
+
+
+def _solve_branch(line, engine):
+    """
+    :return: the solution line of the branch, None if it has no solution or the search
+             was cancelled
+    """
+    sudoku = Sudoku(box_size=box_size_of_line(line))
+    sudoku.read_line(line)
+    try:
+        sudoku.recursive_solve(engine, cancel=_cancel)
+    except (IncorrectSudokuException, SolveBudgetExceeded):
+        return None
+    return sudoku.to_line()
+
+
+def _count_branch(line, limit, engine):
+    """
+    :return: the number of solutions of the branch, at most limit, only the solutions
+             found so far if the search was cancelled
+    """
+    sudoku = Sudoku(box_size=box_size_of_line(line))
+    sudoku.read_line(line)
+    try:
+        return sudoku.count_solutions(limit, engine, cancel=_cancel)
+    except SolveBudgetExceeded as e:
+        return e.solutions
+
+
+def _run(function, arguments, workers, done):
+    """
+    call function(*args) for every tuple of arguments in a pool of worker processes until
+    done(result) returns True, then cancel the other calls
+    :param workers: number of worker processes, with 0 the calls are made one after the
+                    other in this process
+    :return: list of the results that have been collected
+    """
+    global _cancel
+    results = []
+    if workers == 0:
+        _cancel = None
+        for args in arguments:
+            results.append(function(*args))
+            if done(results[-1]):
+                break
+        return results
+    event = multiprocessing.Event()
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(event,))
+    try:
+        pending = {executor.submit(function, *args) for args in arguments}
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results.append(future.result())
+                if done(results[-1]):
+                    event.set()
+                    for other in pending:
+                        other.cancel()
+                    # the running searches see the event at their next guess
+                    results.extend(future.result() for future in pending
+                                   if not future.cancelled())
+                    return results
+        return results
+    finally:
+        event.set()
+        executor.shutdown(cancel_futures=True)
+
+
+def parallel_solve(sudoku, workers=None, engine="rules", branches=None):
+    """
+    Solve the sudoku like Sudoku.recursive_solve(), but search the branches of split() in
+    a pool of worker processes. The first solution found is used.
+    :param workers:     number of worker processes, defaults to the number of cpus,
+                        with 0 the branches are searched in this process
+    :param engine:      engine of the workers, see Sudoku.recursive_solve()
+    :param branches:    number of branches to split the puzzle into, defaults to 4 per
+                        worker
+    :raise IncorrectSudokuException: If the input sudoku has no solution.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    lines, solutions = split(sudoku, branches or 4 * max(workers, 1))
+    if not solutions:
+        solutions = [solution for solution in
+                     _run(_solve_branch, [(line, engine) for line in lines], workers,
+                          lambda solution: solution is not None)
+                     if solution is not None]
+    if not solutions:
+        raise IncorrectSudokuException()
+    sudoku.read_line(solutions[0])
+    sudoku.solved = True
+
+
+def parallel_count(sudoku, limit=2, workers=None, engine="rules", branches=None):
+    """
+    Count the solutions of the sudoku like Sudoku.count_solutions(), but count the
+    solutions of the branches of split() in a pool of worker processes and add them up.
+    The workers are stopped as soon as limit solutions have been found.
+    :param limit:       maximal number of solutions to count, None to count all of them
+    :param workers, engine, branches:   see parallel_solve()
+    :return: the number of solutions, at most limit
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    lines, solutions = split(sudoku, branches or 4 * max(workers, 1))
+    count = len(solutions)
+    if limit is None or count < limit:
+        total = [count]
+
+        def done(result):
+            total[0] += result
+            return limit is not None and total[0] >= limit
+
+        _run(_count_branch, [(line, limit, engine) for line in lines], workers, done)
+        count = total[0]
+    return count if limit is None else min(count, limit)
@@ -0,0 +1,326 @@
+"""
+Local solving service over TCP.
+
+The protocol is line based: a client sends one puzzle per line in the line format of
+Sudoku.read_line and receives one line per puzzle in the same order, either the solution
+or "ERROR <exception name>: <message>", e.g. "ERROR IncorrectSudokuException" for puzzles
+without solution. A client may send many puzzles before it reads the answers.
+
+Concurrent requests of all connections are collected into batches, of up to batch_size
+puzzles or what arrived within batch_delay seconds, which are solved in a pool of worker
+processes that is started and warmed up with the server. Two limits keep the server
+responsive under load: every connection may have at most max_pending unanswered puzzles,
+beyond that the server stops reading from it, and at most max_queue puzzles wait for a
+batch, beyond that new puzzles are answered with "ERROR ServerBusy" right away.
+A budget of nodes or seconds per puzzle keeps a pathological puzzle from stalling a
+worker, such puzzles are answered with "ERROR SolveBudgetExceeded: ...".
+If a worker process dies, e.g. killed for lack of memory, the pool is replaced by a new
+one and the batches it was solving are tried once more in the new pool.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from sudoku import Sudoku
+from sudoku_bulk import _solve_chunk
+
+#: puzzle solved by every worker process when the server starts
+_WARM_UP_PUZZLE = ("000053000100600008050001040400090530009706800027030006040100080"
+                   "200007001000320000")
+
+#: start method of the worker processes, None is the default of the platform
+_MP_CONTEXT = (multiprocessing.get_context("forkserver")
+               if "forkserver" in multiprocessing.get_all_start_methods() else None)
+
+
+class ServerBusy(Exception):
+    """
+    the queue of the server is full, the puzzle was not solved
+    """
+
+
+def _warm_up():
+    """
+    runs in the worker processes so that the first requests do not pay for imports and
+    the set up of the lookup tables
+    """
+    sudoku = Sudoku()
+    sudoku.read_line(_WARM_UP_PUZZLE)
+    sudoku.recursive_solve()
+    return os.getpid()
+
+
+def format_error(error):
+    """
+    :return: the answer line of the protocol for an exception
+    """
+    message = str(error)
+    if message:
+        return "ERROR %s: %s" % (type(error).__name__, message)
+    return "ERROR %s" % type(error).__name__
+
+
+class SolveServer:
+    """
+    Batches the puzzles of concurrent requests and solves them in a pool of worker
+    processes, see the module documentation for the protocol and the limits.
+
+    Attributes:
+        workers         number of worker processes, with 0 the batches are solved in a
+                        thread of the server process
+        batch_size      largest number of puzzles in a batch
+        batch_delay     seconds a batch waits for more puzzles after its first one
+        max_queue       largest number of puzzles waiting for a batch
+        max_pending     largest number of unanswered puzzles of a connection
+        max_nodes       largest number of guesses per puzzle, None for no limit
+        timeout         seconds the search of a puzzle may take, None for no limit
+        requests        number of puzzles received
+        batches         number of batches solved
+        rejected        number of puzzles answered with ServerBusy
+
+        _queue          asyncio.Queue of (puzzle, future) tuples waiting for a batch
+        _slots          asyncio.Semaphore that limits the batches in the pool to two per
+                        worker, so the puzzles wait in _queue while the pool is busy
+        _executor       the pool, None before start() and after close()
+        _warming        future of the warm up of the current pool, see _new_pool()
+        _dispatcher     task of _dispatch()
+        _batches        set of the tasks of the batches in the pool
+    """
+    def __init__(self, workers=None, batch_size=32, batch_delay=0.002, max_queue=1024,
+                 max_pending=64, max_nodes=None, timeout=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_queue = max_queue
+        self.max_pending = max_pending
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.requests = 0
+        self.batches = 0
+        self.rejected = 0
+        self._queue = None
+        self._slots = None
+        self._executor = None
+        self._warming = None
+        self._dispatcher = None
+        self._batches = set()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        start and warm up the pool and listen on host and port
+        :param port:    0 to pick a free port
+        :return: the asyncio.Server, its sockets tell the port
+        """
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(2 * max(self.workers, 1))
+        if self.workers:
+            await self._new_pool()
+        self._dispatcher = loop.create_task(self._dispatch())
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self):
+        """
+        stop the dispatcher and shut down the pool, puzzles still waiting in the queue or
+        in the pool are not answered
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for task in list(self._batches):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def _new_pool(self):
+        """
+        replace the pool by a new one and start its warm up
+        :return: the future of the warm up, also kept in _warming
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        loop = asyncio.get_running_loop()
+        # forked workers would inherit the sockets of the open connections and keep them
+        # open after writer.close(), the fork server is started before the first
+        # connection, by the first pool
+        executor = self._executor = ProcessPoolExecutor(self.workers, _MP_CONTEXT)
+        # one task per worker makes the pool start all of its processes
+        self._warming = asyncio.gather(*(loop.run_in_executor(executor, _warm_up)
+                                         for _ in range(self.workers)))
+        return self._warming
+
+    def submit(self, puzzle):
+        """
+        queue a puzzle for the next batch
+        :param puzzle:  a puzzle line, see Sudoku.read_line
+        :return: asyncio.Future of the solution line, it raises the exception of the
+                 puzzle, e.g. IncorrectSudokuException or ValueError, or ServerBusy if the
+                 queue is full
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        try:
+            self._queue.put_nowait((puzzle, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            future.set_exception(ServerBusy("%i puzzles are waiting" % self.max_queue))
+        return future
+
+    async def solve(self, puzzle):
+        """
+        :return: the solution line of the puzzle, see submit()
+        """
+        return await self.submit(puzzle)
+
+    async def _dispatch(self):
+        """
+        collect the queued puzzles into batches and hand them to the pool
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+            await self._slots.acquire()
+            task = loop.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch):
+        """
+        solve a batch in the pool and resolve the futures of its puzzles
+        :param batch:   list of (puzzle, future) tuples
+        """
+        solve = partial(_solve_chunk, [puzzle for puzzle, _ in batch],
+                        max_nodes=self.max_nodes, timeout=self.timeout)
+        try:
+            for attempt in range(2):
+                executor = self._executor
+                try:
+                    outcomes = await asyncio.get_running_loop().run_in_executor(executor,
+                                                                                solve)
+                    break
+                except BrokenProcessPool:
+                    if attempt == 1:
+                        raise
+                    # the first batch that notices replaces the pool, the others wait for
+                    # the warm up of the new pool
+                    if self._executor is executor:
+                        self._new_pool()
+                    await self._warming
+        except Exception as e:
+            # e.g. a broken pool, every puzzle of the batch gets the error
+            outcomes = [(None, e)] * len(batch)
+        finally:
+            self._slots.release()
+        self.batches += 1
+        for (_, future), (solution, error) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(solution)
+            else:
+                future.set_exception(error)
+
+    async def _handle(self, reader, writer):
+        """
+        serve a connection: read the puzzles and answer them in order
+        """
+        # futures of the unanswered puzzles in order, None after the last puzzle
+        answers = asyncio.Queue(self.max_pending)
+
+        async def respond():
+            while True:
+                future = await answers.get()
+                if future is None:
+                    return
+                try:
+                    line = await future
+                except Exception as e:
+                    line = format_error(e)
+                if writer.is_closing():
+                    # the client is gone, the answers are dropped
+                    continue
+                # the messages of read_line() may quote the U+FFFD of undecodable bytes
+                writer.write(line.encode("ascii", "replace") + b"\n")
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    writer.close()
+
+        responder = asyncio.get_running_loop().create_task(respond())
+        try:
+            async for line in reader:
+                line = line.strip()
+                if line:
+                    # waits while the connection has max_pending unanswered puzzles
+                    await answers.put(self.submit(line.decode("ascii", "replace")))
+            await answers.put(None)
+            await responder
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            responder.cancel()
+            writer.close()
+
+
+async def serve(host, port, **options):
+    """
+    run a SolveServer until the task is cancelled
+    :param options: arguments of SolveServer
+    """
+    server = SolveServer(**options)
+    listener = await server.start(host, port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="solve puzzle lines sent over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes, default: the number of cpus")
+    parser.add_argument("-b", "--batch-size", type=int, default=32)
+    parser.add_argument("-d", "--batch-delay", type=float, default=0.002,
+                        help="seconds a batch waits for more puzzles (default 0.002)")
+    parser.add_argument("-q", "--max-queue", type=int, default=1024,
+                        help="puzzles waiting for a batch before the server is busy")
+    parser.add_argument("-m", "--max-pending", type=int, default=64,
+                        help="unanswered puzzles per connection before it is not read")
+    parser.add_argument("-n", "--max-nodes", type=int, default=None,
+                        help="largest number of guesses per puzzle")
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+                        help="seconds the search of a puzzle may take")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers,
+                          batch_size=args.batch_size, batch_delay=args.batch_delay,
+                          max_queue=args.max_queue, max_pending=args.max_pending,
+                          max_nodes=args.max_nodes, timeout=args.timeout))
+    except KeyboardInterrupt:
+        pass
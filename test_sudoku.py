@@ -1,6 +1,13 @@
+import pickle
+import threading
+import time
+
 from nose.tools import assert_equal
 from nose.tools import raises
-from sudoku import Sudoku, IncorrectSudokuException
+from sudoku import Sudoku, IncorrectSudokuException, SolveObserver, SolveStats, digit_bit, \
+    box_size_of_line, STRATEGIES, DEFAULT_STRATEGIES, _subsets, SolveBudgetExceeded, \
+    CancelToken, SudokuState, _geometry, VARIABLE_ORDERS, VALUE_ORDERS, TranspositionTable, \
+    _DIGITS_CACHE_SIZE
 
 
 def test_read_string():
@@ -18,6 +25,13 @@ def test_read_string():
     assert_equal(str(sudoku), str1)
 
 
+def test_read_line():
+    line = "090000205200300890000025070001060002030090050900010400050740000063008009704000060"
+    sudoku = Sudoku()
+    sudoku.read_line(line.replace("0", "."))
+    assert_equal(sudoku.to_line(), line)
+
+
 def test_only_choice():
     one_choice = " ,  ,  ,  , 3, 4,  ,  ,  ;\n" + \
                  " ,  ,  ,  ,  ,  ,  ,  ,  ;\n" + \
@@ -148,6 +162,161 @@ def test_recursive_solve():
     assert_equal(str(sudoku), solution)
 
 
+def test_recursive_solve_empty():
+    sudoku = Sudoku()
+    sudoku.recursive_solve()
+    digits = list(range(1, 10))
+    for i in range(9):
+        assert_equal(sorted(sudoku.grid[i]), digits)
+        assert_equal(sorted(sudoku.grid[x][i] for x in range(9)), digits)
+        assert_equal(sorted(sudoku.grid[3 * (i // 3) + j // 3][3 * (i % 3) + j % 3]
+                            for j in range(9)), digits)
+
+
+def test_count_solutions():
+    unique = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+    for engine in ("rules", "dlx"):
+        sudoku = Sudoku()
+        sudoku.read_line(unique)
+        assert_equal(sudoku.count_solutions(engine=engine), 1)
+        assert_equal(sudoku.is_unique(engine=engine), True)
+        assert_equal(sudoku.to_line(), unique)
+
+        sudoku = Sudoku()
+        sudoku.read_line("00" + unique[2:])
+        assert_equal(sudoku.count_solutions(limit=None, engine=engine), 1)
+
+        sudoku = Sudoku()
+        assert_equal(sudoku.count_solutions(limit=5, engine=engine), 5)
+        assert_equal(sudoku.is_unique(engine=engine), False)
+
+        sudoku = Sudoku()
+        sudoku.read_line("123000000456000000780900000" + "0" * 54)
+        assert_equal(sudoku.count_solutions(engine=engine), 0)
+
+
+def test_count_solutions_guesses():
+    hard = "800000000003600000070090200050007000000045700000100030001000068008500010090000400"
+    for engine in ("rules", "dlx"):
+        sudoku = Sudoku()
+        sudoku.read_line(hard)
+        assert_equal(sudoku.count_solutions(engine=engine), 1)
+        assert sudoku.guesses > 0
+
+    sudoku = Sudoku()
+    sudoku.solve()
+    sudoku.place(4, 4, 5)
+    assert_equal(sudoku._possCRows[4][5 - 1], 0)
+    assert_equal(sudoku._possCColumns[0][5 - 1], 8)
+    assert_equal(sudoku._possCBoxes[0][0][5 - 1], 9)
+    assert_equal(sudoku._possCBoxes[1][1][5 - 1], 0)
+    assert_equal(sudoku._poss[4][0] & digit_bit(5), 0)
+    assert_equal(sudoku._poss[0][0] & digit_bit(5), digit_bit(5))
+
+
+def test_place_dirty_units():
+    sudoku = Sudoku()
+    sudoku.solve()
+    assert_equal(sudoku._dirty, [])
+    sudoku.place(4, 4, 5)
+    # all columns and rows and the boxes that share a band or stack with (4, 4)
+    assert_equal(sorted(set(sudoku._dirty)),
+                 list(range(18)) + [18 + 1, 18 + 3, 18 + 4, 18 + 5, 18 + 7])
+    sudoku = Sudoku()
+    sudoku.solve()
+    sudoku._remove_poss(0, 8, digit_bit(1))
+    assert_equal(sudoku._dirty, [0, 9 + 8, 18 + 2])
+    assert_equal(sudoku.unit_coords(0), (sudoku.col_coords, 0))
+    assert_equal(sudoku.unit_coords(9 + 8), (sudoku.row_coords, 8))
+    coords, i = sudoku.unit_coords(18 + 2)
+    assert_equal((coords(i, 4), i), (Sudoku.box_coords(2, 4), 2))
+
+
+def test_box_coords():
+    assert_equal(Sudoku.box_coords(2, 4), (1, 7))
+    assert_equal(Sudoku.box_coords(2, 4, box_size=4), (1, 8))
+    sudoku = Sudoku(box_size=4)
+    coords, i = sudoku.unit_coords(32 + 2)
+    assert_equal(coords(i, 4), (1, 8))
+
+
+def test_geometry_tables():
+    geometry = _geometry(3)
+    sudoku = Sudoku()
+    for unit in range(27):
+        coords, i = sudoku.unit_coords(unit)
+        assert_equal(geometry.unit_cells[unit], [coords(i, j) for j in range(9)])
+    assert_equal(geometry.cell_units[4][7], (4, 9 + 7, 18 + 1 * 3 + 2))
+    inside, outside = geometry.subgroups[1 * 3 + 2][0]
+    assert_equal(inside, [(3, 6), (3, 7), (3, 8)])
+    assert_equal(outside, [(3, y) for y in range(6)])
+    inside, outside = geometry.subgroups[1 * 3 + 2][1]
+    assert_equal(inside, [(3, 6), (4, 6), (5, 6)])
+    assert_equal(outside, [(x, 6) for x in (0, 1, 2, 6, 7, 8)])
+
+
+def test_geometry_mask_functions():
+    geometry = _geometry(5)
+    mask = digit_bit(3) | digit_bit(17) | digit_bit(25)
+    assert_equal(geometry.popcount[mask], 3)
+    assert_equal(geometry.lowest_digit[mask], 3)
+    assert_equal(geometry.lowest_digit[0], 0)
+    assert_equal(geometry.digits[mask], (3, 17, 25))
+    # the tables of 25 digits do not grow with the masks looked up
+    for mask in range(1, 20000):
+        geometry.digits[mask]
+    assert geometry.digits._function.cache_info().currsize <= _DIGITS_CACHE_SIZE
+
+
+def test_snapshot():
+    line = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+    sudoku = Sudoku()
+    sudoku.read_line(line)
+    sudoku.solve()
+    state = sudoku.snapshot()
+    assert isinstance(state, SudokuState)
+    assert_equal(state.to_line(), sudoku.to_line())
+    assert_equal(len(state.data), 81 * 3)
+    restored = Sudoku()
+    restored.restore(state)
+    assert_equal(restored.snapshot(), state)
+    assert_equal(hash(restored.snapshot()), hash(state))
+    assert_equal(restored._poss, sudoku._poss)
+    assert_equal(restored._possCBoxes, sudoku._possCBoxes)
+    assert_equal(restored._free_cells, sudoku._free_cells)
+    restored.recursive_solve()
+    sudoku.recursive_solve()
+    assert_equal(restored.grid, sudoku.grid)
+
+    sudoku = Sudoku(box_size=5)
+    sudoku.solve()
+    state = sudoku.snapshot()
+    assert_equal(len(state.data), 625 * 5)
+    restored = Sudoku(box_size=5)
+    restored.restore(state)
+    assert_equal(restored._poss, sudoku._poss)
+
+
+@raises(ValueError)
+def test_restore_other_size():
+    sudoku = Sudoku(box_size=4)
+    sudoku.solve()
+    Sudoku().restore(sudoku.snapshot())
+
+
+@raises(AttributeError)
+def test_slots():
+    Sudoku().unknown = 1
+
+
+@raises(IncorrectSudokuException)
+def test_place_in_peer():
+    sudoku = Sudoku()
+    sudoku.solve()
+    sudoku.place(4, 4, 5)
+    sudoku.place(3, 5, 5)
+
+
 @raises(IncorrectSudokuException)
 def test_incorrect_sudoku():
     incorrect = "1, 2, 3,  ,  ,  ,  ,  ,  ;\n" + \
@@ -162,3 +331,341 @@ def test_incorrect_sudoku():
     sudoku = Sudoku()
     sudoku.read_string(incorrect)
     sudoku.recursive_solve()
+
+
+def test_subsets():
+    popcount = [bin(mask).count("1") for mask in range(16)]
+    masks = [(0, 0b0011), (1, 0b0011), (2, 0b0111), (3, 0b1000)]
+    assert_equal(list(_subsets(masks, 3, popcount)), [([0, 1], 0b0011)])
+    masks = [(0, 0b0011), (1, 0b0110), (2, 0b0101), (3, 0b1001)]
+    assert_equal(list(_subsets(masks, 3, popcount)), [([0, 1, 2], 0b0111)])
+    assert_equal(list(_subsets(masks, 2, popcount)), [])
+
+
+def test_strategies():
+    hard = "800000000003600000070090200050007000000045700000100030001000068008500010090000400"
+    sudoku = Sudoku()
+    sudoku.read_line(hard)
+    expected = Sudoku(sudoku)
+    expected.recursive_solve()
+    for name in STRATEGIES:
+        if name in DEFAULT_STRATEGIES:
+            continue
+        sudoku = Sudoku()
+        sudoku.read_line(hard)
+        sudoku.strategies = DEFAULT_STRATEGIES + (name,)
+        sudoku.observer = SolveStats()
+        sudoku.recursive_solve()
+        assert_equal(sudoku.grid, expected.grid)
+        assert sudoku.guesses < expected.guesses, name
+        assert sudoku.observer.changes[name] > 0, name
+
+
+def test_find_min_poss():
+    hard = "800000000003600000070090200050007000000045700000100030001000068008500010090000400"
+    sudoku = Sudoku()
+    sudoku.read_line(hard)
+    sudoku.solve()
+    counts = [(bin(sudoku._poss[x][y]).count("1"), x, y)
+              for x in range(9) for y in range(9) if sudoku._poss[x][y]]
+    fewest, x, y = min(counts)
+    assert_equal(sudoku._find_min_poss(), (x, y))
+    x, y = sudoku._find_min_poss_degree()
+    assert_equal(bin(sudoku._poss[x][y]).count("1"), fewest)
+
+
+def test_value_orders():
+    sudoku = Sudoku()
+    sudoku.solve()
+    sudoku.place(0, 0, 9)
+    digits = list(range(1, 10))
+    assert_equal(list(sudoku._ascending_digits(1, 3)), digits)
+    # 9 is possible in 14 peers of (1, 3), the other digits in all 20
+    assert_equal(list(sudoku._least_constraining_digits(1, 3)), [9] + digits[:8])
+    # 9 has 8 possible cells in the row and the column of (3, 3), the other digits 9
+    assert_equal(list(sudoku._rarest_digits(3, 3)), [9] + digits[:8])
+
+
+def test_policies():
+    hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+    expected = Sudoku()
+    expected.read_line(hard)
+    expected.recursive_solve()
+    for variable_order in VARIABLE_ORDERS:
+        for value_order in VALUE_ORDERS:
+            sudoku = Sudoku()
+            sudoku.read_line(hard)
+            sudoku.variable_order = variable_order
+            sudoku.value_order = value_order
+            copy = Sudoku(sudoku)
+            assert_equal((copy.variable_order, copy.value_order), (variable_order, value_order))
+            sudoku.recursive_solve()
+            assert_equal(sudoku.grid, expected.grid)
+            assert_equal(copy.count_solutions(), 1)
+
+
+def test_plugged_strategy():
+    units_seen = []
+
+    def record(sudoku, units):
+        units_seen.append(units)
+        return False
+
+    STRATEGIES["record"] = record
+    try:
+        sudoku = Sudoku()
+        sudoku.read_line("0" * 81)
+        sudoku.strategies = ("record",)
+        sudoku.observer = SolveStats()
+        sudoku.solve()
+        assert_equal(units_seen, [set(range(27))])
+        assert_equal(sudoku.observer.calls["record"], 1)
+    finally:
+        del STRATEGIES["record"]
+
+
+def test_solve_stats():
+    sudoku = Sudoku()
+    sudoku.read_line("0" * 81)
+    sudoku.observer = SolveStats()
+    sudoku.recursive_solve()
+    stats = sudoku.observer
+    assert_equal(sudoku.solved, True)
+    assert_equal(stats.nodes, sudoku.guesses)
+    assert_equal(stats.calls["guess"], sudoku.guesses)
+    assert_equal(stats.solutions, 1)
+    assert stats.max_depth > 0
+    assert stats.calls["only_choice"] + stats.calls["single_possibility"] >= 81 - stats.max_depth
+    assert_equal(stats.as_dict()["hidden_twin.calls"], stats.calls["hidden_twin"])
+
+
+def test_observer_events():
+    class Recorder(SolveObserver):
+        def __init__(self):
+            self.events = []
+
+        def on_guess(self, x, y, n, candidates, depth, seconds):
+            self.events.append(("guess", depth))
+
+        def on_backtrack(self, depth):
+            self.events.append(("backtrack", depth))
+
+        def on_solution(self, depth):
+            self.events.append(("solution", depth))
+
+    sudoku = Sudoku()
+    sudoku.read_line("0" * 81)
+    sudoku.observer = Recorder()
+    assert_equal(sudoku.count_solutions(3), 3)
+    events = sudoku.observer.events
+    assert_equal(events[0], ("guess", 1))
+    assert_equal(sum(kind == "solution" for kind, _ in events), 3)
+    # a solution is found at the depth of the last guess, a guess is made one level below
+    # the last guess that has not been taken back
+    depth = 0
+    for kind, event_depth in events:
+        if kind == "guess":
+            assert event_depth <= depth + 1
+            depth = event_depth
+        elif kind == "backtrack":
+            assert event_depth <= depth
+            depth = event_depth - 1
+        else:
+            assert_equal(event_depth, depth)
+
+
+def test_box_size_of_line():
+    assert_equal(box_size_of_line("0" * 81), 3)
+    assert_equal(box_size_of_line("0" * 256 + "\n"), 4)
+    assert_equal(box_size_of_line("0" * 625), 5)
+
+
+@raises(ValueError)
+def test_box_size_of_line_no_square():
+    box_size_of_line("0" * 100)
+
+
+def test_read_line_16x16():
+    line = "123456789ABCDEFG" + "." * 240
+    sudoku = Sudoku(box_size=4)
+    sudoku.read_line(line)
+    assert_equal(sudoku.grid[9][0], 10)
+    assert_equal(sudoku.grid[15][0], 16)
+    assert_equal(sudoku.to_line(), line.replace(".", "0"))
+
+
+@raises(ValueError)
+def test_read_line_wrong_size():
+    Sudoku(box_size=4).read_line("0" * 81)
+
+
+def test_read_string_16x16():
+    sudoku = Sudoku(box_size=4)
+    sudoku.read_string("16, 2,  , 10;\n ,  , 11;\n")
+    assert_equal(sudoku.grid[0][0], 16)
+    assert_equal(sudoku.grid[3][0], 10)
+    assert_equal(sudoku.grid[2][1], 11)
+    assert_equal(sudoku.grid[1][1], 0)
+    copy = Sudoku(box_size=4)
+    copy.read_string(str(sudoku))
+    assert_equal(copy.grid, sudoku.grid)
+
+
+def test_recursive_solve_sizes():
+    for box_size, engine in ((2, "rules"), (2, "dlx"), (4, "rules"), (4, "dlx"), (5, "dlx")):
+        sudoku = Sudoku(box_size=box_size)
+        sudoku.recursive_solve(engine)
+        size = box_size * box_size
+        digits = list(range(1, size + 1))
+        for i in range(size):
+            assert_equal(sorted(sudoku.grid[i]), digits)
+            assert_equal(sorted(sudoku.grid[x][i] for x in range(size)), digits)
+            bx, by = divmod(i, box_size)
+            assert_equal(sorted(sudoku.grid[box_size * bx + j % box_size]
+                                [box_size * by + j // box_size] for j in range(size)),
+                         digits)
+        assert_equal(Sudoku(sudoku).count_solutions(), 1)
+
+
+def test_read_string_line():
+    line = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+    sudoku = Sudoku()
+    sudoku.read_string(line)
+    assert_equal(sudoku.to_line(), line)
+
+
+@raises(ValueError)
+def test_read_line_no_digit():
+    Sudoku().read_line("x" * 81)
+
+
+hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+
+
+def test_recursive_solve_max_nodes():
+    for engine in ("rules", "dlx"):
+        sudoku = Sudoku()
+        sudoku.read_line(hard)
+        propagated = Sudoku(sudoku)
+        propagated.solve()
+        try:
+            sudoku.recursive_solve(engine, max_nodes=5)
+            assert False, "no SolveBudgetExceeded"
+        except SolveBudgetExceeded as e:
+            assert_equal(e.reason, "max_nodes")
+            assert_equal(e.nodes, 5)
+            assert e.max_depth > 0
+            assert_equal(sudoku.guesses, 5)
+        if engine == "rules":
+            assert_equal(sudoku.grid, propagated.grid)
+        sudoku.recursive_solve(engine, max_nodes=10000)
+        assert sudoku.solved
+
+
+def test_recursive_solve_deadline():
+    sudoku = Sudoku()
+    sudoku.read_line(hard)
+    try:
+        sudoku.recursive_solve(deadline=time.monotonic())
+        assert False, "no SolveBudgetExceeded"
+    except SolveBudgetExceeded as e:
+        assert_equal(e.reason, "deadline")
+        assert_equal(e.nodes, 0)
+    # the propagation alone solves this one, no guess is checked
+    sudoku = Sudoku()
+    sudoku.read_line("004000000090600200015793000047020003000050900000400507000060009"
+                     "000005004002074600")
+    sudoku.recursive_solve(deadline=time.monotonic())
+    assert sudoku.solved
+
+
+def test_count_solutions_cancel():
+    cancel = CancelToken()
+    timer = threading.Timer(0.05, cancel.cancel)
+    timer.start()
+    try:
+        Sudoku().count_solutions(limit=None, cancel=cancel)
+        assert False, "no SolveBudgetExceeded"
+    except SolveBudgetExceeded as e:
+        assert_equal(e.reason, "cancelled")
+        assert e.solutions > 0
+        assert e.nodes >= e.solutions
+    finally:
+        timer.cancel()
+    assert cancel.cancelled
+
+
+def test_transposition_table_count():
+    # the first 56 cells of a solved sudoku, the rest has 192 completions
+    rows = "12345678945678912378912345621436589736589721489721436553" + "0" * 25
+    sudoku = Sudoku()
+    sudoku.read_line(rows)
+    table = TranspositionTable()
+    assert_equal(sudoku.count_solutions(None, table=table), 192)
+    stats = table.stats()
+    assert_equal(stats["hits"], 0)
+    assert stats["size"] > 0
+    assert stats["memory_bytes"] > 0
+    # the whole grid is known now
+    assert_equal(sudoku.count_solutions(None, table=table), 192)
+    assert_equal(table.stats()["hits"], 1)
+    assert_equal(sudoku.count_solutions(5, table=table), 5)
+    # the first guess of the search was 6 in (0, 7), so the grid with this clue is known
+    sudoku.grid[0][7] = 6
+    misses = table.misses
+    assert_equal(sudoku.count_solutions(None, table=table), 96)
+    assert_equal(table.hits, 3)
+    assert_equal(table.misses, misses)
+    assert_equal(sudoku.count_solutions(None), 96)
+    # the excluded digits are part of the key
+    exclude = [(1, 7, 8)]
+    assert_equal(sudoku.count_solutions(None, exclude=exclude, table=table),
+                 sudoku.count_solutions(None, exclude=exclude))
+
+
+def test_transposition_table_solve():
+    incorrect = ("000000012000000003002300400001800005060070800000009000008500000"
+                 "900040500470006001")
+    table = TranspositionTable()
+    for guesses in (True, False):
+        sudoku = Sudoku()
+        sudoku.read_line(incorrect)
+        try:
+            sudoku.recursive_solve(table=table)
+            assert False, "no IncorrectSudokuException"
+        except IncorrectSudokuException:
+            pass
+        # the second search finds the grid in the table
+        assert_equal(sudoku.guesses > 0, guesses)
+    hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+    sudoku = Sudoku()
+    sudoku.read_line(hard)
+    expected = Sudoku(sudoku)
+    expected.recursive_solve()
+    sudoku.recursive_solve(table=table)
+    assert_equal(sudoku.grid, expected.grid)
+
+
+def test_transposition_table_eviction():
+    table = TranspositionTable(maxsize=2)
+    table.store(1, 0)
+    table.store(2, 3)
+    assert_equal(table.get(1), 0)
+    table.store(3, 1)
+    assert_equal(table.get(2), None)
+    assert_equal(table.get(1), 0)
+    stats = table.stats()
+    assert_equal((stats["hits"], stats["misses"], stats["size"], stats["evictions"]),
+                 (2, 1, 2, 1))
+    table.clear()
+    assert_equal(table.stats()["size"], 0)
+    assert_equal(table.stats()["hits"], 0)
+
+
+def test_solve_budget_exceeded_pickle():
+    error = SolveBudgetExceeded("max_nodes", 10, 4, 0.5)
+    error.solutions = 3
+    copy = pickle.loads(pickle.dumps(error))
+    assert_equal((copy.reason, copy.nodes, copy.max_depth, copy.seconds, copy.solutions),
+                 ("max_nodes", 10, 4, 0.5, 3))
+    assert_equal(str(copy), str(error))
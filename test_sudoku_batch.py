@@ -0,0 +1,49 @@
+import os
+import tempfile
+from unittest import SkipTest
+
+from nose.tools import assert_equal
+from nose.tools import raises
+
+try:
+    import numpy
+except ImportError:
+    raise SkipTest("numpy is not installed")
+
+from sudoku_batch import read_lines, to_lines, solve_batch, read_packed, write_packed
+from sudoku_io import write_packed as write_packed_lines
+
+puzzles = ["000053000100600008050001040400090530009706800027030006040100080200007001000320000",
+           "003020600900305001001806400008102900700000008006708200002609500800203009005010300",
+           "123000000456000000780900000" + "0" * 54]
+solutions = ["684253179193674258752981643416892537539716824827435916345169782268547391971328465",
+             "483921657967345821251876493548132976729564138136798245372689514814253769695417382"]
+
+
+def test_read_lines():
+    assert_equal(to_lines(read_lines(p.replace("0", ".") for p in puzzles)), puzzles)
+
+
+def test_solve_batch():
+    values, solved = solve_batch(read_lines(puzzles))
+    assert_equal(list(solved), [True, True, False])
+    assert_equal(to_lines(values[:2]), solutions)
+
+
+@raises(ValueError)
+def test_read_lines_16x16():
+    read_lines([puzzles[0], "0" * 256])
+
+
+@raises(ValueError)
+def test_solve_batch_no_digit():
+    solve_batch(read_lines([puzzles[0], "a" + puzzles[1][1:]]))
+
+
+def test_read_packed():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "puzzles.bin")
+        write_packed_lines(path, puzzles)
+        assert_equal(to_lines(read_packed(path)), puzzles)
+        write_packed(path, read_lines(puzzles))
+        assert_equal(to_lines(read_packed(path)), puzzles)
@@ -0,0 +1,78 @@
+from nose.tools import assert_equal
+from nose.tools import raises
+import sudoku_benchmark
+from sudoku import Sudoku
+
+puzzle = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+
+
+def test_bundled_corpora():
+    corpora = sudoku_benchmark.bundled_corpora()
+    for name in ("easy", "propagation", "seventeen", "hard"):
+        assert name in corpora
+    for line in sudoku_benchmark.read_puzzles(corpora["seventeen"]):
+        assert_equal(len(line), 81)
+        assert_equal(81 - line.count("0"), 17)
+    for line in sudoku_benchmark.read_puzzles(corpora["hard"]):
+        # the propagation alone does not solve the hard puzzles, they need guesses
+        sudoku = Sudoku()
+        sudoku.read_line(line)
+        assert_equal(sudoku.solve(), False)
+
+
+def test_run_method():
+    times, guesses, solved, peak = sudoku_benchmark.run_method([puzzle, "0" * 81], "rules",
+                                                               trace_memory=True)
+    assert_equal(len(times), 2)
+    assert_equal(solved, 2)
+    assert guesses[1] > 0
+    assert peak > 0
+    _, guesses, _, peak = sudoku_benchmark.run_method([puzzle], "solve")
+    assert_equal(guesses, [0])
+    assert_equal(peak, 0)
+
+
+@raises(ValueError)
+def test_run_method_unknown():
+    sudoku_benchmark.run_method([puzzle], "guess")
+
+
+def test_percentile():
+    values = list(range(100, 0, -1))
+    assert_equal(sudoku_benchmark.percentile(values, 0.5), 50)
+    assert_equal(sudoku_benchmark.percentile(values, 0.99), 99)
+    assert_equal(sudoku_benchmark.percentile(values, 0), 1)
+    assert_equal(sudoku_benchmark.percentile([3], 0.99), 3)
+
+
+def test_compare():
+    baseline = sudoku_benchmark.benchmark({"easy": [puzzle]}, ["rules"])
+    assert_equal(sudoku_benchmark.compare(baseline, baseline), [])
+    slower = [dict(baseline[0], per_second=baseline[0]["per_second"] / 2,
+                   guesses=baseline[0]["guesses"] + 10)]
+    regressions = sudoku_benchmark.compare(slower, baseline, tolerance=0.1)
+    assert_equal(len(regressions), 2)
+    assert regressions[0].startswith("easy/rules: per_second")
+    assert_equal(sudoku_benchmark.compare(slower, [], tolerance=0.1), [])
+
+
+def test_measure_strategies():
+    hard = "000000039000001005003050800008090006070002000100400000009080050020000600400700000"
+    rows = sudoku_benchmark.measure_strategies({"hard": [hard]}, ["naked_subset"])
+    assert_equal([row["strategy"] for row in rows], ["default", "naked_subset"])
+    assert_equal(rows[0]["guesses_saved"], 0)
+    assert_equal(rows[1]["guesses_saved"], rows[0]["guesses"] - rows[1]["guesses"])
+    assert rows[1]["guesses_saved"] > 0
+    assert rows[1]["changes"] > 0
+
+
+def test_measure_policies():
+    hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+    rows = sudoku_benchmark.measure_policies({"hard": [hard]}, ["mrv", "mrv_degree"],
+                                             ["ascending"])
+    assert_equal([(row["variable_order"], row["value_order"]) for row in rows],
+                 [("mrv", "ascending"), ("mrv_degree", "ascending")])
+    assert_equal(rows[0]["nodes_saved"], 0)
+    assert_equal(rows[1]["nodes_saved"], rows[0]["nodes"] - rows[1]["nodes"])
+    assert rows[0]["nodes"] > 0
+    assert_equal(rows[0]["max_nodes"], rows[0]["nodes"])
@@ -0,0 +1,40 @@
+from nose.tools import assert_equal
+from sudoku import IncorrectSudokuException, SolveBudgetExceeded
+from sudoku_bulk import solve_many
+
+puzzle = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+solution = "684253179193674258752981643416892537539716824827435916345169782268547391971328465"
+incorrect = "123000000456000000780900000" + "0" * 54
+
+
+def test_solve_many_in_process():
+    results = list(solve_many([puzzle, incorrect, "12"], workers=0, chunksize=2))
+    assert_equal([r.index for r in results], [0, 1, 2])
+    assert_equal(results[0].solution, solution)
+    assert_equal(type(results[1].error), IncorrectSudokuException)
+    assert_equal(type(results[2].error), ValueError)
+
+
+def test_solve_many_ordered():
+    puzzles = [puzzle, incorrect] * 5
+    results = list(solve_many(iter(puzzles), workers=2, chunksize=3))
+    assert_equal([r.index for r in results], list(range(10)))
+    assert_equal([r.solution for r in results], [solution, None] * 5)
+
+
+def test_solve_many_unordered():
+    puzzles = [puzzle, incorrect] * 5
+    results = list(solve_many(puzzles, workers=2, chunksize=1, ordered=False))
+    assert_equal(sorted(r.index for r in results), list(range(10)))
+    for r in results:
+        assert_equal(r.error is None, r.puzzle == puzzle)
+
+
+def test_solve_many_budget():
+    hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+    # the exception of the hard puzzle is sent back from the worker process
+    results = list(solve_many([hard, puzzle], workers=1, max_nodes=10))
+    assert_equal(type(results[0].error), SolveBudgetExceeded)
+    assert_equal(results[0].error.reason, "max_nodes")
+    assert_equal(results[0].error.nodes, 10)
+    assert_equal(results[1].solution, solution)
@@ -0,0 +1,97 @@
+from unittest import SkipTest
+
+from nose.tools import assert_equal
+
+try:
+    import numpy
+except ImportError:
+    raise SkipTest("numpy is not installed")
+
+from sudoku import Sudoku, IncorrectSudokuException
+from sudoku_cache import canonical_form, transform_grid, untransform_grid, SolutionCache
+
+puzzle = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+
+
+def transformed(line, rows, columns, transpose, labels):
+    values = [[int(line[9 * r + c]) for c in range(9)] for r in range(9)]
+    values = [[values[r][c] for c in columns] for r in rows]
+    if transpose:
+        values = [list(column) for column in zip(*values)]
+    return "".join(str(labels[n]) for row in values for n in row)
+
+
+def sudoku_of(line):
+    sudoku = Sudoku()
+    sudoku.read_line(line)
+    return sudoku
+
+
+def test_canonical_form_isomorphic():
+    key, _ = canonical_form(sudoku_of(puzzle).grid)
+    assert_equal(len(key), 81)
+    labels = [0, 2, 1, 3, 4, 9, 6, 7, 8, 5]
+    for rows, columns, transpose in (
+            ([3, 4, 5, 0, 1, 2, 7, 6, 8], list(range(9)), True),
+            (list(range(9)), [0, 1, 2, 6, 7, 8, 5, 4, 3], False),
+            ([8, 6, 7, 2, 1, 0, 4, 5, 3], [4, 3, 5, 2, 0, 1, 8, 7, 6], True)):
+        other = transformed(puzzle, rows, columns, transpose, labels)
+        assert other != puzzle
+        assert_equal(canonical_form(sudoku_of(other).grid)[0], key)
+
+
+def test_canonical_form_different():
+    other = puzzle[:-1] + "5"
+    assert canonical_form(sudoku_of(puzzle).grid)[0] != canonical_form(sudoku_of(other).grid)[0]
+
+
+def test_canonical_form_empty():
+    assert_equal(canonical_form(sudoku_of("0" * 81).grid), None)
+
+
+def test_transform_grid():
+    grid = sudoku_of(puzzle).grid
+    key, transform = canonical_form(grid)
+    canonical = transform_grid(grid, transform)
+    assert_equal(bytes(canonical[x][y] for y in range(9) for x in range(9)), key)
+    assert_equal(untransform_grid(canonical, transform), grid)
+
+
+def test_solution_cache():
+    cache = SolutionCache(maxsize=2)
+    first = sudoku_of(puzzle)
+    cache.solve(first)
+    other = sudoku_of(transformed(puzzle, [2, 1, 0, 3, 4, 5, 6, 7, 8], list(range(9)), True,
+                                  [0, 9, 8, 7, 6, 5, 4, 3, 2, 1]))
+    expected = Sudoku(other)
+    expected.recursive_solve()
+    cache.solve(other)
+    assert other.solved
+    assert_equal(other.grid, expected.grid)
+    assert_equal(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 1,
+                                 "maxsize": 2})
+
+
+def test_solution_cache_eviction():
+    cache = SolutionCache(maxsize=1)
+    cache.solve(sudoku_of(puzzle))
+    cache.solve(sudoku_of("003020600900305001001806400008102900700000008006708200002609500"
+                          "800203009005010300"))
+    cache.solve(sudoku_of(puzzle))
+    assert_equal(cache.stats()["hits"], 0)
+    assert_equal(cache.stats()["size"], 1)
+    cache.clear()
+    assert_equal(cache.stats()["misses"], 0)
+
+
+def test_solution_cache_incorrect():
+    cache = SolutionCache()
+    # the 5 in the first row appears twice
+    line = "5" + puzzle[1:]
+    for other in (line, transformed(line, list(range(9)), list(range(9)), True, range(10))):
+        try:
+            cache.solve(sudoku_of(other))
+            assert False, "no IncorrectSudokuException"
+        except IncorrectSudokuException:
+            pass
+    assert_equal(cache.hits, 1)
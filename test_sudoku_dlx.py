@@ -0,0 +1,43 @@
+from nose.tools import assert_equal
+from nose.tools import raises
+from sudoku import Sudoku, IncorrectSudokuException
+import sudoku_dlx
+
+puzzle = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+solution = "684253179193674258752981643416892537539716824827435916345169782268547391971328465"
+
+
+def test_dlx_engine():
+    sudoku = Sudoku()
+    sudoku.read_line(puzzle)
+    sudoku.recursive_solve(engine="dlx")
+    assert_equal(sudoku.to_line(), solution)
+    assert_equal(sudoku.solved, True)
+
+
+def test_dlx_solutions():
+    sudoku = Sudoku()
+    sudoku.read_line("0" * 81)
+    solutions = sudoku_dlx.DancingLinks(sudoku.grid).solutions()
+    first = next(solutions)
+    assert_equal(len(first), 81)
+    assert_equal(len(set(first)), 81)
+    assert next(solutions) != first
+
+
+def test_dlx_conflicting_givens():
+    sudoku = Sudoku()
+    sudoku.read_line("11" + "0" * 79)
+    assert_equal(sudoku_dlx.solve(sudoku.grid), None)
+
+
+@raises(IncorrectSudokuException)
+def test_dlx_incorrect_sudoku():
+    sudoku = Sudoku()
+    sudoku.read_line("123000000456000000780900000" + "0" * 54)
+    sudoku.recursive_solve(engine="dlx")
+
+
+@raises(ValueError)
+def test_unknown_engine():
+    Sudoku().recursive_solve(engine="magic")
@@ -0,0 +1,52 @@
+import random
+
+from nose.tools import assert_equal
+from sudoku import Sudoku
+from sudoku_generator import generate, generate_many, random_grid
+
+
+def test_random_grid():
+    sudoku = random_grid(random.Random(1))
+    assert_equal(sudoku.solved, True)
+    assert_equal(sudoku.count_solutions(), 1)
+
+
+def test_generate():
+    puzzle, solution = generate(clues=30, rng=random.Random(2))
+    assert 81 - puzzle.count("0") <= 30
+    sudoku = Sudoku()
+    sudoku.read_line(puzzle)
+    assert_equal(sudoku.is_unique(), True)
+    sudoku.recursive_solve()
+    assert_equal(sudoku.to_line(), solution)
+
+
+def test_generate_symmetry():
+    puzzle, _ = generate(symmetry="rotational", rng=random.Random(3))
+    clues = [c != "0" for c in puzzle]
+    assert_equal(clues, clues[::-1])
+
+
+def test_generate_engines_agree():
+    # the propagated checks of the rules engine remove the same clues as the searches
+    for seed in range(3):
+        for symmetry in ("none", "dihedral"):
+            assert_equal(generate(symmetry=symmetry, rng=random.Random(seed)),
+                         generate(symmetry=symmetry, rng=random.Random(seed), engine="dlx"))
+
+
+def test_generate_many():
+    puzzles = list(generate_many(3, workers=2, seed="test", chunksize=1, clues=28))
+    assert_equal(puzzles, list(generate_many(3, workers=0, seed="test", clues=28)))
+
+
+def test_generate_16x16():
+    puzzle, solution = generate(clues=200, symmetry="rotational", rng=random.Random(4),
+                                box_size=4, engine="dlx")
+    assert_equal(len(puzzle), 256)
+    assert 256 - puzzle.count("0") <= 200
+    sudoku = Sudoku(box_size=4)
+    sudoku.read_line(puzzle)
+    assert_equal(sudoku.is_unique(), True)
+    sudoku.recursive_solve()
+    assert_equal(sudoku.to_line(), solution)
@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+from nose.tools import assert_equal
+from nose.tools import raises
+from sudoku_bulk import solve_many
+from sudoku_io import PACKED_SIZE, pack_line, unpack_line, write_packed, read_packed, \
+    read_lines
+
+puzzles = ["000053000100600008050001040400090530009706800027030006040100080200007001000320000",
+           "684253179193674258752981643416892537539716824827435916345169782268547391971328465"]
+
+
+def test_pack_line():
+    packed = pack_line(puzzles[0])
+    assert_equal(len(packed), PACKED_SIZE)
+    assert_equal(packed[:3], bytes([0x00, 0x00, 0x53]))
+    assert_equal(unpack_line(packed), puzzles[0])
+    assert_equal(pack_line(puzzles[0].replace("0", ".") + "\n"), packed)
+
+
+@raises(ValueError)
+def test_pack_line_no_digit():
+    pack_line("a" + puzzles[0][1:])
+
+
+@raises(ValueError)
+def test_pack_line_too_short():
+    pack_line(puzzles[0][1:])
+
+
+def test_packed_file():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "puzzles.bin")
+        assert_equal(write_packed(path, puzzles), 2)
+        assert_equal(os.path.getsize(path), 2 * PACKED_SIZE)
+        assert_equal(list(read_packed(path)), puzzles)
+        write_packed(path, [])
+        assert_equal(list(read_packed(path)), [])
+
+
+@raises(ValueError)
+def test_read_packed_truncated():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "puzzles.bin")
+        with open(path, "wb") as f:
+            f.write(pack_line(puzzles[0])[:-1])
+        list(read_packed(path))
+
+
+def test_read_lines():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "puzzles.txt")
+        with open(path, "w") as f:
+            f.write(puzzles[0] + "\n\n" + puzzles[1] + "\r\n")
+        assert_equal(list(read_lines(path)), puzzles)
+
+
+def test_read_lines_not_ascii():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "puzzles.txt")
+        with open(path, "wb") as f:
+            f.write(puzzles[0].encode("ascii") + b"\n\xff" + puzzles[0][1:].encode("ascii")
+                    + b"\n" + puzzles[1].encode("ascii") + b"\n")
+        lines = list(read_lines(path))
+        assert_equal(lines, [puzzles[0], "\ufffd" + puzzles[0][1:], puzzles[1]])
+        results = list(solve_many(lines, workers=0))
+        assert_equal(results[0].solution, puzzles[1])
+        assert_equal(type(results[1].error), ValueError)
+        assert_equal(results[2].solution, puzzles[1])
@@ -0,0 +1,59 @@
+from nose.tools import assert_equal, raises
+
+from sudoku import Sudoku, IncorrectSudokuException
+from sudoku_parallel import split, parallel_solve, parallel_count
+
+hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+incorrect = "123000000456000000780900000" + "0" * 54
+# the first 56 cells of a solved sudoku, the rest has 192 completions
+rows = "12345678945678912378912345621436589736589721489721436553" + "0" * 25
+
+
+def sudoku_of(line):
+    sudoku = Sudoku()
+    sudoku.read_line(line)
+    return sudoku
+
+
+def test_split():
+    sudoku = sudoku_of(hard)
+    lines, solutions = split(sudoku, 8)
+    assert len(lines) >= 8
+    assert_equal(solutions, [])
+    assert_equal(sudoku.to_line(), hard)
+    for line in lines:
+        # every branch keeps the given digits
+        assert all(c == "0" or line[i] == c for i, c in enumerate(hard))
+    assert_equal(split(sudoku_of(incorrect), 8), ([], []))
+
+
+def test_parallel_solve():
+    expected = sudoku_of(hard)
+    expected.recursive_solve()
+    for workers in (0, 2):
+        sudoku = sudoku_of(hard)
+        parallel_solve(sudoku, workers=workers)
+        assert sudoku.solved
+        assert_equal(sudoku.grid, expected.grid)
+
+
+def test_parallel_solve_first_solution():
+    sudoku = Sudoku()
+    parallel_solve(sudoku, workers=2, branches=16)
+    check = Sudoku(sudoku)
+    check.solve()
+    assert check.solved
+
+
+@raises(IncorrectSudokuException)
+def test_parallel_solve_incorrect():
+    parallel_solve(sudoku_of(incorrect), workers=0)
+
+
+def test_parallel_count():
+    sudoku = sudoku_of(rows)
+    assert_equal(parallel_count(sudoku, limit=None, workers=2), 192)
+    assert_equal(parallel_count(sudoku, limit=None, workers=0, branches=7), 192)
+    assert_equal(parallel_count(sudoku, limit=100, workers=2), 100)
+    assert_equal(parallel_count(sudoku_of(hard), workers=2), 1)
+    assert_equal(parallel_count(sudoku_of(incorrect), workers=2), 0)
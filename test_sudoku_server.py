@@ -0,0 +1,117 @@
+import asyncio
+import os
+
+from nose.tools import assert_equal
+
+from sudoku import IncorrectSudokuException
+from sudoku_loadtest import load_test
+from sudoku_server import SolveServer, ServerBusy, format_error
+
+puzzle = "000053000100600008050001040400090530009706800027030006040100080200007001000320000"
+solution = "684253179193674258752981643416892537539716824827435916345169782268547391971328465"
+incorrect = "123000000456000000780900000" + "0" * 54
+
+
+async def _exchange(port, lines):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write("".join(line + "\n" for line in lines).encode("ascii"))
+    writer.write_eof()
+    answers = (await reader.read()).decode("ascii").splitlines()
+    writer.close()
+    return answers
+
+
+def _run_server(test, **options):
+    async def run():
+        server = SolveServer(**options)
+        listener = await server.start()
+        try:
+            return await test(server, listener.sockets[0].getsockname()[1])
+        finally:
+            listener.close()
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_format_error():
+    assert_equal(format_error(IncorrectSudokuException()), "ERROR IncorrectSudokuException")
+    assert_equal(format_error(ValueError("bad")), "ERROR ValueError: bad")
+
+
+def test_server_answers_in_order():
+    async def test(server, port):
+        answers = await _exchange(port, [puzzle, incorrect, "", "12", puzzle])
+        assert_equal(answers, [solution, "ERROR IncorrectSudokuException",
+                               "ERROR ValueError: 2 characters are no square grid of boxes",
+                               solution])
+        assert_equal(server.requests, 4)
+        assert server.batches >= 1
+    _run_server(test, workers=0, batch_delay=0.01)
+
+
+def test_server_batches_concurrent_requests():
+    async def test(server, port):
+        answers = await asyncio.gather(*(_exchange(port, [puzzle] * 3) for _ in range(4)))
+        assert_equal(answers, [[solution] * 3] * 4)
+        assert server.batches < 12
+    _run_server(test, workers=1, batch_delay=0.05)
+
+
+def test_server_budget():
+    hard = "000000012000000003002300400001800005060070800000009000008500000900040500470006000"
+
+    async def test(server, port):
+        answers = await _exchange(port, [hard, puzzle])
+        assert answers[0].startswith("ERROR SolveBudgetExceeded: max_nodes after 10 nodes")
+        assert_equal(answers[1], solution)
+    # the exception is sent back from the worker process
+    _run_server(test, workers=1, max_nodes=10)
+
+
+def test_server_busy():
+    async def test(server, port):
+        # the dispatcher has no chance to take puzzles from the queue in between
+        futures = [server.submit(puzzle) for _ in range(3)]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        assert_equal(results[:2], [solution, solution])
+        assert_equal(type(results[2]), ServerBusy)
+        assert_equal(server.rejected, 1)
+    _run_server(test, workers=0, max_queue=2)
+
+
+def test_load_test():
+    async def test(server, port):
+        return await load_test([puzzle, incorrect], port=port, requests=9, connections=2,
+                               pipeline=3)
+    result = _run_server(test, workers=0)
+    assert_equal(result["requests"], 9)
+    assert_equal(result["errors"], {"IncorrectSudokuException": 4})
+    assert result["p50_ms"] <= result["p99_ms"] <= result["max_ms"]
+
+
+def test_server_undecodable_line():
+    async def test(server, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"\xff" + puzzle[1:].encode("ascii") + b"\n" + puzzle.encode("ascii")
+                     + b"\n")
+        writer.write_eof()
+        answers = (await reader.read()).decode("ascii").splitlines()
+        writer.close()
+        assert_equal(len(answers), 2)
+        assert answers[0].startswith("ERROR ValueError: '?'")
+        assert_equal(answers[1], solution)
+    _run_server(test, workers=0)
+
+
+def test_server_replaces_broken_pool():
+    async def test(server, port):
+        broken = server._executor
+        # a worker process that dies breaks the pool
+        try:
+            await asyncio.get_running_loop().run_in_executor(broken, os._exit, 1)
+        except Exception:
+            pass
+        assert_equal(await _exchange(port, [puzzle, puzzle]), [solution, solution])
+        assert server._executor is not broken
+        assert_equal(await _exchange(port, [puzzle]), [solution])
+    _run_server(test, workers=1)